@@ -0,0 +1,100 @@
+"""Module with precomputed and simultaneous modular exponentiation for DSA."""
+import threading
+from collections import OrderedDict
+
+DEFAULT_WINDOW = 6
+MULTI_WINDOW = 3
+CACHE_SIZE = 256
+
+_tables = OrderedDict()
+_tables_lock = threading.Lock()
+
+
+class FixedBaseExp:
+    """
+    Class for repeated exponentiation of one fixed base modulo p.
+
+    Keeps base^(j * 2^(w*i)) mod p for every w-bit window i and digit j,
+    so base^e mod p takes one multiplication per window and no squarings.
+    """
+    def __init__(self, base, p, exp_bits, width=DEFAULT_WINDOW):
+        self.base = base
+        self.p = p
+        self.exp_bits = exp_bits
+        self.width = width
+
+        self.rows = []
+        window_base = base % p
+        for _ in range(-(-exp_bits // width)):
+            row = [1]
+            for _ in range((1 << width) - 1):
+                row.append(row[-1] * window_base % p)
+            self.rows.append(row)
+            window_base = row[-1] * window_base % p # base^(2^(w*(i+1)))
+
+    def pow(self, exponent):
+        """
+        Function to compute base^exponent mod p.
+        Falls back to the builtin pow for exponents the table does not cover.
+        """
+        if exponent < 0 or exponent.bit_length() > self.exp_bits:
+            return pow(self.base, exponent, self.p)
+
+        result = 1
+        mask = (1 << self.width) - 1
+        for row in self.rows:
+            digit = exponent & mask
+            if digit:
+                result = result * row[digit] % self.p
+            exponent >>= self.width
+        return result
+
+
+def get_fixed_base(base, p, exp_bits):
+    """
+    Function to get the cached FixedBaseExp for a base, building it on first use.
+    Keeps the CACHE_SIZE most recently used tables.
+    """
+    key = (base, p, exp_bits)
+    with _tables_lock:
+        table = _tables.get(key)
+        if table is not None:
+            _tables.move_to_end(key)
+            return table
+
+    table = FixedBaseExp(base, p, exp_bits)
+    with _tables_lock:
+        _tables[key] = table
+        while len(_tables) > CACHE_SIZE:
+            _tables.popitem(last=False)
+    return table
+
+
+def multi_pow(pairs, p, width=MULTI_WINDOW):
+    """
+    Function to compute the product of base^exponent mod p over all pairs
+    in a single pass (Straus/Shamir trick).
+
+    The exponents are scanned together in w-bit windows, so the squarings
+    are shared and each window costs one multiplication per base.
+    pairs: list of (base, exponent) tuples with non-negative exponents.
+    """
+    mask = (1 << width) - 1
+    tables = []
+    for base, _ in pairs:
+        row = [1]
+        for _ in range(mask):
+            row.append(row[-1] * base % p)
+        tables.append(row)
+
+    bits = max(exponent.bit_length() for _, exponent in pairs)
+    result = 1
+    for shift in range((bits - 1) // width * width, -1, -width):
+        if result != 1:
+            for _ in range(width):
+                result = result * result % p
+        for row, (_, exponent) in zip(tables, pairs):
+            digit = (exponent >> shift) & mask
+            if digit:
+                result = result * row[digit] % p
+    return result
@@ -1,7 +1,11 @@
 """Module to generate DSA keys and parameters."""
 import random
+import secrets
 import hashlib
+import queue
+import threading
 from DSA.utils import get_prime, get_strong_prime
+from DSA.exponentiation import get_fixed_base
 
 def generate_params():
     """
@@ -33,18 +37,92 @@ def generate_keys(p, q, g):
     y = pow(g, x, p) # public key is g^x mod p
     return x, y
 
-def sign_message(message, p, q, g, x):
+class SigningPool:
+    """
+    Class keeping a pool of precomputed (k, r, k_inv) tuples for DSA signing.
+
+    None of these values depend on the message, so a background thread
+    computes them ahead of time with a fixed-base table for g, and signing
+    only needs the hash and one multiplication modulo q.
+    """
+    def __init__(self, p, q, g, depth=64):
+        self.p = p
+        self.q = q
+        self.g = g
+        self.g_table = get_fixed_base(g, p, q.bit_length())
+        self._pool = queue.Queue(maxsize=depth)
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Function to start the refill thread."""
+        if self._thread is None:
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._refill, daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Function to stop the refill thread."""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def precompute(self):
+        """
+        Function to compute one (k, r, k_inv) tuple.
+        r is g^k mod p mod q, k_inv is k^-1 mod q.
+        """
+        while True:
+            k = secrets.randbelow(self.q - 1) + 1 # a predictable nonce leaks the private key
+            r = self.g_table.pow(k) % self.q
+            if r != 0:
+                return k, r, pow(k, -1, self.q)
+
+    def take(self):
+        """
+        Function to get a precomputed tuple.
+        Computes one on the spot if the pool has run dry, so it never waits.
+        """
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            return self.precompute()
+
+    def __len__(self):
+        return self._pool.qsize()
+
+    def _refill(self):
+        while not self._stopped.is_set():
+            item = self.precompute()
+            while not self._stopped.is_set():
+                try:
+                    self._pool.put(item, timeout=0.5) # blocks while the pool is full
+                    break
+                except queue.Full:
+                    continue
+
+
+def sign_message(message, p, q, g, x, pool=None):
     """
     Function to sign a message using DSA.
     Returns a tuple of (r, s) where:
     r is the first part of the signature,
     s is the second part of the signature.
+    With a SigningPool the message-independent part comes precomputed.
     """
     hash_obj = hashlib.sha1(message.encode())
     hash_value = int(hash_obj.hexdigest(), 16)
 
+    while pool is not None:
+        k, r, k_inv = pool.take()
+        s = (k_inv * (hash_value + x * r)) % q
+        if s != 0:
+            return (r, s)
+
     while True:
-        k = random.randrange(1, q) # randomly chosen k
+        k = secrets.randbelow(q - 1) + 1 # randomly chosen k, from a CSPRNG
         r = pow(g, k, p) % q # r is g^k mod p, first part of the signature
         if r == 0:
             continue
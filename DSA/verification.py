@@ -1,10 +1,16 @@
 """Module for verifying DSA signatures."""
 import hashlib
-def verify_sign(message, sign, p, q, g, y):
-    """Function to verify a DSA signature."""
+from collections import OrderedDict
+from DSA.exponentiation import FixedBaseExp, get_fixed_base, multi_pow
+
+def _weights(message, sign, q):
+    """
+    Function to compute the exponents t1, t2 of the verification formula.
+    Returns None if the signature fails the basic range check.
+    """
     r, s = sign
     if not (0 < r < q and 0 < s < q): # basic check
-        return False
+        return None
 
     hash_obj = hashlib.sha1(message.encode()) # hash again
     hash_v = int(hash_obj.hexdigest(), 16)
@@ -12,6 +18,130 @@ def verify_sign(message, sign, p, q, g, y):
     w = pow(s, -1, q) # inverted s in power of q
     t1 = (hash_v * w) % q # weighting original value
     t2 = (r * w) % q # now weighting the imprint (kinda)
-    valid = ((pow(g, t1, p) * pow(y, t2, p)) % p) % q # crazy formula to check the validity
+    return t1, t2
+
+def verify_sign(message, sign, p, q, g, y, cache_y=False):
+    """
+    Function to verify a DSA signature.
+    g^t1 * y^t2 is computed in one pass; with cache_y the precomputed
+    tables for g and y are kept for the next message from the same sender.
+    """
+    weights = _weights(message, sign, q)
+    if weights is None:
+        return False
+
+    t1, t2 = weights
+    if cache_y:
+        bits = q.bit_length()
+        product = get_fixed_base(g, p, bits).pow(t1) * get_fixed_base(y, p, bits).pow(t2)
+    else:
+        product = multi_pow(((g, t1), (y, t2)), p)
+    valid = (product % p) % q # crazy formula to check the validity
+
+    return valid == sign[0]
+
+
+def verify_batch(items, p, q, g, table_threshold=8):
+    """
+    Function to verify many DSA signatures at once.
+    items: list of (message, sign, y) tuples.
+    Returns a list of booleans, one per item, in the same order.
+
+    Standard DSA only ships r = (g^k mod p) mod q, so the signatures cannot
+    be folded into one randomized product check; instead the batch shares
+    the precomputation. g is raised through its fixed-base table, senders
+    with at least table_threshold messages get a table of their own, and
+    everyone else pays a single builtin pow for the y part.
+    """
+    bits = q.bit_length()
+    g_table = get_fixed_base(g, p, bits)
+
+    counts = {}
+    for _, _, y in items:
+        counts[y] = counts.get(y, 0) + 1
+
+    results = []
+    for message, sign, y in items:
+        weights = _weights(message, sign, q)
+        if weights is None:
+            results.append(False)
+            continue
+
+        t1, t2 = weights
+        if counts[y] >= table_threshold:
+            y_part = get_fixed_base(y, p, bits).pow(t2)
+        else:
+            y_part = pow(y, t2, p)
+        results.append((g_table.pow(t1) * y_part) % p % q == sign[0])
+
+    return results
+
+
+class SenderContext:
+    """
+    Class keeping the precomputed tables needed to verify one sender.
+    y gets its own table only once the sender has signed table_threshold
+    messages, the same trade-off as in verify_batch: building it costs
+    about as much as a few verifications and a fair bit of memory.
+    """
+    def __init__(self, p, q, g, y, table_threshold=8):
+        self.p = p
+        self.q = q
+        self.y = y
+        self.table_threshold = table_threshold
+        self.verified = 0
+        self.g_table = get_fixed_base(g, p, q.bit_length())
+        self.y_table = None
+
+    def verify(self, message, sign):
+        """Function to verify a DSA signature of this sender."""
+        weights = _weights(message, sign, self.q)
+        if weights is None:
+            return False
+
+        t1, t2 = weights
+        self.verified += 1
+        if self.y_table is None and self.verified >= self.table_threshold:
+            self.y_table = FixedBaseExp(self.y, self.p, self.q.bit_length())
+        if self.y_table is not None:
+            y_part = self.y_table.pow(t2)
+        else:
+            y_part = pow(self.y, t2, self.p)
+        valid = (self.g_table.pow(t1) * y_part) % self.p % self.q
+        return valid == sign[0]
+
+
+class SenderCache:
+    """
+    Class keeping the SenderContext of the most recent senders, by username.
+    """
+    def __init__(self, p, q, g, maxsize=64):
+        self.p = p
+        self.q = q
+        self.g = g
+        self.maxsize = maxsize
+        self._contexts = OrderedDict()
+
+    def get(self, username, y):
+        """
+        Function to get the context of a sender for the key y from the key directory.
+        Raises ValueError if the sender has a context for another key:
+        forget() it first, when the directory reports the key has changed.
+        """
+        context = self._contexts.get(username)
+        if context is None:
+            context = SenderContext(self.p, self.q, self.g, y)
+            self._contexts[username] = context
+            while len(self._contexts) > self.maxsize:
+                self._contexts.popitem(last=False)
+        elif context.y != y:
+            raise ValueError(f'Signing key of {username} has changed')
+        self._contexts.move_to_end(username)
+        return context
 
-    return valid == r
+    def forget(self, username=None):
+        """Function to drop the context of a sender, or of everyone."""
+        if username is None:
+            self._contexts.clear()
+        else:
+            self._contexts.pop(username, None)
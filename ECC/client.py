@@ -1,5 +1,10 @@
 import random
+import secrets
+import threading
 import ECC.utils as utils
+import ECC.curves as curves
+import ECC.jacobian as jacobian
+import ECC.fixed_base as fixed_base
 from sympy.ntheory import sqrt_mod
 from hashlib import sha256
 from Crypto.Cipher import AES
@@ -56,7 +61,47 @@ class Point:
 
     def __mul__(self, k):
         """
-        Implements point multiple addition
+        Implements point multiple addition in Jacobian coordinates with w-NAF
+
+        :param k: int, how many times to add
+        :return: Point
+        """
+        if not isinstance(k, int):
+            raise ValueError('Not am integer')
+
+        curve = self.curve
+        result = jacobian.multiply(jacobian.to_jacobian(self.x, self.y), k, curve.a, curve.mod)
+        affine = jacobian.to_affine(result, curve.mod) ## the only inversion
+        if affine is None:
+            return None
+        return Point(affine[0], affine[1], curve)
+
+    def multiply_base(self, k):
+        """
+        Multiplies the point as a fixed base, through its cached precomputed table
+
+        Meant for points that are multiplied over and over, like a curve generator.
+
+        :param k: int, how many times to add
+        :return: Point
+        """
+        if not isinstance(k, int):
+            raise ValueError('Not am integer')
+
+        table = fixed_base.get_table(self.curve, self.x, self.y)
+        if k < 0 or k.bit_length() > table.bits:
+            return self * k
+
+        affine = jacobian.to_affine(table.multiply(k), self.curve.mod)
+        if affine is None:
+            return None
+        return Point(affine[0], affine[1], self.curve)
+
+    def multiply_affine(self, k):
+        """
+        Implements point multiple addition with affine double-and-add
+
+        Every step inverts modulo curve.mod, kept for comparison.
 
         :param k: int, how many times to add
         :return: Point
@@ -93,22 +138,68 @@ class Point:
         return cls(x, y, curve)
 
 
+class NamedCurve(Curve):
+    """
+    A standard curve with a fixed generator of known prime order
+    """
+    def __init__(self, name, params):
+        super().__init__(params.a, params.b, params.mod)
+        self.name = name
+        self.order = params.order
+        self.generator = Point(params.gx, params.gy, self)
+
+
+_curves = {}
+_curves_lock = threading.Lock()
+
+
+def get_curve(name=curves.DEFAULT_CURVE):
+    """
+    Returns the named curve, built once and shared afterwards
+    (so is the fixed-base table of its generator)
+
+    :param name: str, a key of ECC.curves.NAMED_CURVES
+    :return: NamedCurve
+    """
+    with _curves_lock:
+        curve = _curves.get(name)
+        if curve is None:
+            if name not in curves.NAMED_CURVES:
+                raise ValueError(f'Unknown curve {name}')
+            curve = _curves[name] = NamedCurve(name, curves.NAMED_CURVES[name])
+        return curve
+
+
 class ECC:
     """
     The ECC class
     """
     @staticmethod
-    def create_keys():
+    def create_keys(curve_name=curves.DEFAULT_CURVE):
         """
         Generates keys
 
+        :param curve_name: str, a named curve, or None for a new random curve (several prime searches)
         :return: tuple[str, str], private and public keys
         """
+        if curve_name is not None:
+            curve = get_curve(curve_name)
+            p = secrets.randbelow(curve.order - 1) + 1 ## ECC private key
+            r = secrets.randbelow(curve.order - 1) + 1
+
+            ## P * r and R * p below are both G * (p * r); with a known group
+            ## order that is a single multiplication through G's fixed-base table
+            S = curve.generator.multiply_base(p * r % curve.order)
+            public_key = sha256(S.x.to_bytes(32)).digest()
+            private_key = sha256(S.x.to_bytes(32)).digest()
+            return private_key, public_key
+
         curve = Curve(utils.get_prime(), utils.get_prime(), utils.get_prime())
 
         G = Point.get_valid_point(curve) ## defining an initial point
         p = utils.get_prime() ## defining a huge randon number(ECC private key)
 
+        ## G is new on every call, a fixed-base table for it would never be used again
         P = G * p ## computing ECC public key
 
         r = utils.get_prime()
@@ -0,0 +1,42 @@
+"""Parameters of standard named curves (SEC 2).
+
+A curve here is y^2 = x^3 + ax + b over the prime field `mod`, with a
+fixed generator (gx, gy) of prime order `order`. ECC.client.get_curve
+turns these into cached Curve objects.
+"""
+from collections import namedtuple
+
+CurveParams = namedtuple('CurveParams', 'a b mod gx gy order')
+
+DEFAULT_CURVE = 'secp256r1'
+
+NAMED_CURVES = {
+    'secp256r1': CurveParams(
+        a=0xffffffff00000001000000000000000000000000fffffffffffffffffffffffc,
+        b=0x5ac635d8aa3a93e7b3ebbd55769886bc651d06b0cc53b0f63bce3c3e27d2604b,
+        mod=0xffffffff00000001000000000000000000000000ffffffffffffffffffffffff,
+        gx=0x6b17d1f2e12c4247f8bce6e563a440f277037d812deb33a0f4a13945d898c296,
+        gy=0x4fe342e2fe1a7f9b8ee7eb4a7c0f9e162bce33576b315ececbb6406837bf51f5,
+        order=0xffffffff00000000ffffffffffffffffbce6faada7179e84f3b9cac2fc632551,
+    ),
+    'secp256k1': CurveParams(
+        a=0,
+        b=7,
+        mod=0xfffffffffffffffffffffffffffffffffffffffffffffffffffffffefffffc2f,
+        gx=0x79be667ef9dcbbac55a06295ce870b07029bfcdb2dce28d959f2815b16f81798,
+        gy=0x483ada7726a3c4655da4fbfc0e1108a8fd17b448a68554199c47d08ffb10d4b8,
+        order=0xfffffffffffffffffffffffffffffffebaaedce6af48a03bbfd25e8cd0364141,
+    ),
+}
+
+
+def register_curve(name, params):
+    """
+    Adds a curve to the named curves
+
+    :param name: str
+    :param params: CurveParams
+    """
+    if (params.gy ** 2 - params.gx ** 3 - params.a * params.gx - params.b) % params.mod:
+        raise ValueError('The generator is not on the curve')
+    NAMED_CURVES[name] = params
@@ -0,0 +1,93 @@
+"""Fixed-base windowed precomputation for repeated multiplication of one point.
+
+For a base point P the table holds j * 2^(w*i) * P for every window
+position i and digit j, so k * P is a sum of one table entry per w-bit
+window of k: no doublings and only mixed additions. Tables are built once
+per (curve, base point) and kept in a small LRU cache.
+"""
+import threading
+from collections import OrderedDict
+
+import ECC.jacobian as jacobian
+
+DEFAULT_WINDOW = 4
+CACHE_SIZE = 16
+
+_tables = OrderedDict()
+_tables_lock = threading.Lock()
+
+
+class FixedBaseTable:
+    """
+    Precomputed multiples of a fixed point
+    """
+    def __init__(self, x, y, a, mod, bits, width=DEFAULT_WINDOW):
+        self.a = a
+        self.mod = mod
+        self.bits = bits
+        self.width = width
+
+        points = []
+        base = jacobian.to_jacobian(x, y)
+        for _ in range(-(-bits // width)):
+            row = [base]
+            for _ in range((1 << width) - 2):
+                row.append(jacobian.add(row[-1], base, a, mod))
+            points.extend(row)
+            base = jacobian.add(row[-1], base, a, mod) ## 2^w * base, the next window
+
+        ## every entry gets Z = 1, so multiply() only does mixed additions
+        self.rows = []
+        points = jacobian.normalize(points, mod)
+        row_len = (1 << width) - 1
+        for i in range(0, len(points), row_len):
+            self.rows.append(points[i:i + row_len])
+
+    def multiply(self, k):
+        """
+        Multiplies the base point by a scalar of at most self.bits bits
+
+        :param k: int
+        :return: tuple[int, int, int] or None, a Jacobian point
+        """
+        if k < 0 or k.bit_length() > self.bits:
+            raise ValueError('Scalar does not fit the table')
+
+        result = None
+        mask = (1 << self.width) - 1
+        for row in self.rows:
+            digit = k & mask
+            if digit:
+                result = jacobian.add(result, row[digit - 1], self.a, self.mod)
+            k >>= self.width
+        return result
+
+
+def get_table(curve, x, y, bits=None, width=DEFAULT_WINDOW):
+    """
+    Returns the cached table for a base point, building it on first use
+
+    :param curve: Curve
+    :param x: int
+    :param y: int
+    :param bits: int, the largest supported scalar size, a window above the field size by default
+                 (scalars here are not reduced by the group order)
+    :param width: int, window width
+    :return: FixedBaseTable
+    """
+    if bits is None:
+        bits = curve.mod.bit_length() + width
+    key = (curve.a, curve.b, curve.mod, x, y, bits, width)
+
+    with _tables_lock:
+        table = _tables.get(key)
+        if table is not None:
+            _tables.move_to_end(key)
+            return table
+
+    table = FixedBaseTable(x, y, curve.a, curve.mod, bits, width)
+    with _tables_lock:
+        _tables[key] = table
+        while len(_tables) > CACHE_SIZE:
+            _tables.popitem(last=False)
+    return table
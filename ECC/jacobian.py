@@ -0,0 +1,202 @@
+"""Jacobian-coordinate arithmetic and w-NAF scalar multiplication.
+
+A point (X, Y, Z) stands for the affine point (X / Z^2, Y / Z^3), so
+additions and doublings need no modular inverse. Only the final
+conversion back to affine coordinates inverts Z. The point at infinity
+is None, as in ECC.client.Point.
+"""
+
+DEFAULT_WINDOW = 4
+
+
+def to_jacobian(x, y):
+    """
+    Converts an affine point to Jacobian coordinates
+
+    :param x: int
+    :param y: int
+    :return: tuple[int, int, int]
+    """
+    return x, y, 1
+
+
+def to_affine(point, mod):
+    """
+    Converts a Jacobian point back to affine coordinates (one inversion)
+
+    :param point: tuple[int, int, int] or None
+    :param mod: int, the field modulus
+    :return: tuple[int, int] or None
+    """
+    if point is None:
+        return None
+    x, y, z = point
+    z_inv = pow(z, -1, mod)
+    z_inv2 = z_inv * z_inv % mod
+    return x * z_inv2 % mod, y * z_inv2 * z_inv % mod
+
+
+def negate(point, mod):
+    """
+    Negates a Jacobian point
+
+    :param point: tuple[int, int, int] or None
+    :param mod: int
+    :return: tuple[int, int, int] or None
+    """
+    if point is None:
+        return None
+    x, y, z = point
+    return x, -y % mod, z
+
+
+def double(point, a, mod):
+    """
+    Doubles a Jacobian point on y^2 = x^3 + ax + b
+
+    :param point: tuple[int, int, int] or None
+    :param a: int, the curve coefficient
+    :param mod: int
+    :return: tuple[int, int, int] or None
+    """
+    if point is None:
+        return None
+    x, y, z = point
+    if y == 0:
+        return None
+
+    yy = y * y % mod
+    zz = z * z % mod
+    s = 4 * x * yy % mod
+    m = (3 * x * x + a * zz * zz) % mod ## the tangent slope, scaled by z^4
+    x3 = (m * m - 2 * s) % mod
+    y3 = (m * (s - x3) - 8 * yy * yy) % mod
+    z3 = 2 * y * z % mod
+    return x3, y3, z3
+
+
+def add(first, second, a, mod):
+    """
+    Adds two Jacobian points
+
+    :param first: tuple[int, int, int] or None
+    :param second: tuple[int, int, int] or None
+    :param a: int, the curve coefficient
+    :param mod: int
+    :return: tuple[int, int, int] or None
+    """
+    if first is None:
+        return second
+    if second is None:
+        return first
+
+    x1, y1, z1 = first
+    x2, y2, z2 = second
+    z1z1 = z1 * z1 % mod
+    u2 = x2 * z1z1 % mod
+    s2 = y2 * z1 * z1z1 % mod
+    if z2 == 1: ## mixed addition with an affine second point
+        u1, s1 = x1, y1
+    else:
+        z2z2 = z2 * z2 % mod
+        u1 = x1 * z2z2 % mod
+        s1 = y1 * z2 * z2z2 % mod
+
+    if u1 == u2:
+        if s1 != s2:
+            return None ## P + (-P)
+        return double(first, a, mod)
+
+    h = (u2 - u1) % mod
+    r = (s2 - s1) % mod
+    hh = h * h % mod
+    hhh = h * hh % mod
+    v = u1 * hh % mod
+    x3 = (r * r - hhh - 2 * v) % mod
+    y3 = (r * (v - x3) - s1 * hhh) % mod
+    z3 = h * z1 % mod if z2 == 1 else h * z1 * z2 % mod
+    return x3, y3, z3
+
+
+def normalize(points, mod):
+    """
+    Brings Jacobian points to Z = 1 with a single shared inversion (Montgomery's trick)
+
+    :param points: list[tuple[int, int, int] or None], points at infinity stay None
+    :param mod: int
+    :return: list[tuple[int, int, int] or None]
+    """
+    prefix = []
+    acc = 1
+    for point in points:
+        prefix.append(acc)
+        if point is not None:
+            acc = acc * point[2] % mod
+
+    inv = pow(acc, -1, mod)
+    result = [None] * len(points)
+    for i in range(len(points) - 1, -1, -1):
+        if points[i] is None:
+            continue
+        x, y, z = points[i]
+        z_inv = inv * prefix[i] % mod
+        inv = inv * z % mod
+        z_inv2 = z_inv * z_inv % mod
+        result[i] = (x * z_inv2 % mod, y * z_inv2 * z_inv % mod, 1)
+    return result
+
+
+def wnaf(k, width=DEFAULT_WINDOW):
+    """
+    Computes the width-w non-adjacent form of k
+
+    :param k: int, non-negative scalar
+    :param width: int, window width (>= 2)
+    :return: list[int], odd digits below 2^(width-1) in absolute value, least significant first
+    """
+    digits = []
+    window = 1 << width
+    while k > 0:
+        if k & 1:
+            digit = k & (window - 1)
+            if digit >= window >> 1:
+                digit -= window
+            k -= digit
+        else:
+            digit = 0
+        digits.append(digit)
+        k >>= 1
+    return digits
+
+
+def multiply(point, k, a, mod, width=DEFAULT_WINDOW):
+    """
+    Multiplies a Jacobian point by a scalar with the w-NAF method
+
+    :param point: tuple[int, int, int] or None
+    :param k: int
+    :param a: int, the curve coefficient
+    :param mod: int
+    :param width: int, window width
+    :return: tuple[int, int, int] or None
+    """
+    if k < 0:
+        return multiply(negate(point, mod), -k, a, mod, width)
+    if point is None or k == 0:
+        return None
+
+    ## odd multiples P, 3P, 5P, ..., (2^(w-1) - 1)P
+    twice = double(point, a, mod)
+    table = [point]
+    for _ in range((1 << (width - 2)) - 1):
+        table.append(add(table[-1], twice, a, mod))
+
+    result = None
+    for digit in reversed(wnaf(k, width)):
+        result = double(result, a, mod)
+        if digit > 0:
+            result = add(result, table[digit >> 1], a, mod)
+        elif digit < 0:
+            result = add(result, negate(table[-digit >> 1], mod), a, mod)
+
+    return result
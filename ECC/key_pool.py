@@ -0,0 +1,97 @@
+"""Background pool of ready ECC key pairs."""
+import json
+import os
+import queue
+import threading
+
+import ECC.curves as curves
+from ECC.client import ECC
+
+
+class KeyPool:
+    """
+    Class keeping a few ECC key pairs generated ahead of time.
+
+    A daemon thread keeps the pool full, so take() normally returns at
+    once. With a path, unused pairs are saved there by stop() and loaded
+    back by the next start(), so even the first take() of a new process
+    does not wait. Every pair is handed out once: the file is removed as
+    soon as it is loaded.
+    """
+    def __init__(self, depth=4, curve_name=curves.DEFAULT_CURVE, path=None):
+        self.curve_name = curve_name
+        self.path = path
+        self._pool = queue.Queue(maxsize=depth)
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Function to load the warm pool and start the refill thread."""
+        if self._thread is None:
+            self._load()
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._refill, daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Function to stop the refill thread and save the unused pairs."""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._save()
+
+    def take(self):
+        """
+        Function to get a fresh (private_key, public_key) pair.
+        Generates one in place if the pool is empty.
+        """
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            return ECC.create_keys(self.curve_name)
+
+    def __len__(self):
+        return self._pool.qsize()
+
+    def _refill(self):
+        while not self._stopped.is_set():
+            pair = ECC.create_keys(self.curve_name)
+            while not self._stopped.is_set():
+                try:
+                    self._pool.put(pair, timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+
+    def _load(self):
+        if self.path is None or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                pairs = json.load(f)
+        except (OSError, ValueError):
+            pairs = []
+        os.remove(self.path) ## never hand out a saved pair twice
+        for private_key, public_key in pairs:
+            if self._pool.full():
+                break
+            self._pool.put((bytes.fromhex(private_key), bytes.fromhex(public_key)))
+
+    def _save(self):
+        if self.path is None:
+            return
+        pairs = []
+        while True:
+            try:
+                private_key, public_key = self._pool.get_nowait()
+            except queue.Empty:
+                break
+            pairs.append((private_key.hex(), public_key.hex()))
+        if not pairs:
+            return
+        ## private keys: readable by the owner only
+        fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(pairs, f)
@@ -0,0 +1,237 @@
+"""Streaming authenticated encryption for large payloads.
+
+The plaintext is cut into fixed-size chunks, each sealed with AES-GCM on
+its own, so memory use does not depend on the payload size. A stream is
+
+    header: magic b'SGC1', chunk size (4 bytes), nonce prefix (8 bytes)
+    chunks: ciphertext (chunk size bytes, the last one shorter) + 16 byte tag
+
+Chunk i uses the nonce prefix || i as its 12-byte nonce. Its AAD is the
+header, i and a flag marking the last chunk, so chunks cannot be
+reordered, moved to another stream, or cut off at the end without
+failing authentication. There is always a last chunk, empty if the
+payload fills the chunks exactly.
+"""
+import os
+import struct
+from typing import AsyncIterable, AsyncIterator, BinaryIO
+
+from Crypto.Cipher import AES
+
+MAGIC = b'SGC1'
+CHUNK_SIZE = 64 * 1024
+TAG_SIZE = 16
+HEADER_SIZE = len(MAGIC) + 4 + 8
+MAX_CHUNK_SIZE = 16 * 1024 * 1024
+
+
+def _seal(key, header, prefix, index, final, chunk):
+    cipher = AES.new(key, AES.MODE_GCM, nonce=prefix + struct.pack('>I', index))
+    cipher.update(header + struct.pack('>QB', index, final))
+    ciphertext, tag = cipher.encrypt_and_digest(chunk)
+    return ciphertext + tag
+
+
+def _open(key, header, prefix, index, final, sealed):
+    cipher = AES.new(key, AES.MODE_GCM, nonce=prefix + struct.pack('>I', index))
+    cipher.update(header + struct.pack('>QB', index, final))
+    try:
+        return cipher.decrypt_and_verify(sealed[:-TAG_SIZE], sealed[-TAG_SIZE:])
+    except ValueError as e:
+        raise ValueError(f'Chunk {index} failed authentication') from e
+
+
+class StreamEncryptor:
+    """
+    Incremental encryptor: feed plaintext to update(), then call finalize() once
+    """
+    def __init__(self, key: bytes, chunk_size: int = CHUNK_SIZE):
+        if not 0 < chunk_size <= MAX_CHUNK_SIZE:
+            raise ValueError('Unsupported chunk size')
+        self.key = key
+        self.chunk_size = chunk_size
+        self.prefix = os.urandom(8)
+        self.header = MAGIC + struct.pack('>I', chunk_size) + self.prefix
+        self._index = 0
+        self._buffer = bytearray()
+        self._started = False
+
+    def update(self, data: bytes) -> bytes:
+        """
+        Encrypts what can be encrypted so far
+
+        :param data: bytes, the next part of the plaintext
+        :return: bytes, the header and every chunk completed by data
+        """
+        self._buffer += data
+        out = [self._take_header()]
+        ## keep at least one byte back: only finalize() knows which chunk is the last
+        while len(self._buffer) > self.chunk_size:
+            out.append(self._chunk(bytes(self._buffer[:self.chunk_size]), False))
+            del self._buffer[:self.chunk_size]
+        return b''.join(out)
+
+    def finalize(self) -> bytes:
+        """
+        :return: bytes, the last chunk
+        """
+        last = self._take_header() + self._chunk(bytes(self._buffer), True)
+        self._buffer.clear()
+        return last
+
+    def seal_chunk(self, index: int, chunk: bytes, final: bool) -> bytes:
+        """
+        Encrypts one chunk out of order, for senders that resend or resume
+        from the middle. The header still has to reach the reader first.
+
+        :param index: int, position of the chunk in the stream
+        :param chunk: bytes, plaintext, chunk_size bytes unless final
+        :param final: bool, whether this is the last chunk
+        :return: bytes, ciphertext and tag
+        """
+        return _seal(self.key, self.header, self.prefix, index, final, chunk)
+
+    def _take_header(self):
+        if self._started:
+            return b''
+        self._started = True
+        return self.header
+
+    def _chunk(self, chunk, final):
+        sealed = _seal(self.key, self.header, self.prefix, self._index, final, chunk)
+        self._index += 1
+        return sealed
+
+
+class StreamDecryptor:
+    """
+    Incremental decryptor: feed the stream to update() in pieces of any size, then call finalize()
+
+    update() only returns authenticated plaintext. A stream that is cut
+    short fails in finalize(), so the output is complete only after it.
+    """
+    def __init__(self, key: bytes, header: bytes = None):
+        self.key = key
+        self.header = None
+        self.prefix = None
+        self.chunk_size = None
+        self._sealed_size = None
+        self._index = 0
+        self._buffer = bytearray()
+        if header is not None: ## received separately, as for out of order chunks
+            if len(header) != HEADER_SIZE:
+                raise ValueError('Not an encrypted stream')
+            self._buffer += header
+            self._read_header()
+
+    def update(self, data: bytes) -> bytes:
+        """
+        :param data: bytes, the next part of the stream
+        :return: bytes, the plaintext of every chunk completed by data
+        """
+        self._buffer += data
+        if self.header is None:
+            if len(self._buffer) < HEADER_SIZE:
+                return b''
+            self._read_header()
+
+        out = []
+        ## a chunk is known not to be the last only once more data follows it
+        while len(self._buffer) > self._sealed_size:
+            sealed = bytes(self._buffer[:self._sealed_size])
+            del self._buffer[:self._sealed_size]
+            out.append(_open(self.key, self.header, self.prefix, self._index, False, sealed))
+            self._index += 1
+        return b''.join(out)
+
+    def finalize(self) -> bytes:
+        """
+        :return: bytes, the plaintext of the last chunk
+        """
+        if self.header is None or len(self._buffer) < TAG_SIZE:
+            raise ValueError('Truncated stream')
+        last = _open(self.key, self.header, self.prefix, self._index, True, bytes(self._buffer))
+        self._buffer.clear()
+        return last
+
+    def open_chunk(self, index: int, sealed: bytes, final: bool) -> bytes:
+        """
+        Decrypts one chunk sealed by StreamEncryptor.seal_chunk
+
+        :return: bytes, the plaintext; ValueError if it fails authentication
+        """
+        if self.header is None:
+            raise ValueError('The stream header has not been read')
+        if len(sealed) < TAG_SIZE or len(sealed) > self._sealed_size:
+            raise ValueError(f'Chunk {index} has a wrong size')
+        return _open(self.key, self.header, self.prefix, index, final, sealed)
+
+    def _read_header(self):
+        header = bytes(self._buffer[:HEADER_SIZE])
+        if header[:len(MAGIC)] != MAGIC:
+            raise ValueError('Not an encrypted stream')
+        (chunk_size,) = struct.unpack_from('>I', header, len(MAGIC))
+        if not 0 < chunk_size <= MAX_CHUNK_SIZE:
+            raise ValueError('Unsupported chunk size')
+        self.header = header
+        self.prefix = header[-8:]
+        self.chunk_size = chunk_size
+        self._sealed_size = chunk_size + TAG_SIZE
+        del self._buffer[:HEADER_SIZE]
+
+
+def encrypt_file(key: bytes, source: BinaryIO, target: BinaryIO, chunk_size: int = CHUNK_SIZE):
+    """
+    Encrypts one file object into another, holding about two chunks in memory
+
+    :param key: bytes, AES key (16, 24 or 32 bytes)
+    :param source: readable binary file object
+    :param target: writable binary file object
+    :param chunk_size: int
+    """
+    encryptor = StreamEncryptor(key, chunk_size)
+    while True:
+        data = source.read(chunk_size)
+        if not data:
+            break
+        target.write(encryptor.update(data))
+    target.write(encryptor.finalize())
+
+
+def decrypt_file(key: bytes, source: BinaryIO, target: BinaryIO, read_size: int = CHUNK_SIZE):
+    """
+    Decrypts a stream written by encrypt_file. Raises ValueError if it was
+    tampered with or cut short; target then holds only a verified prefix.
+    """
+    decryptor = StreamDecryptor(key)
+    while True:
+        data = source.read(read_size)
+        if not data:
+            break
+        target.write(decryptor.update(data))
+    target.write(decryptor.finalize())
+
+
+async def encrypt_stream(key: bytes, chunks: AsyncIterable[bytes],
+                         chunk_size: int = CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """
+    Encrypts an async iterator of plaintext pieces, yielding the encrypted stream
+    """
+    encryptor = StreamEncryptor(key, chunk_size)
+    async for data in chunks:
+        out = encryptor.update(data)
+        if out:
+            yield out
+    yield encryptor.finalize()
+
+
+async def decrypt_stream(key: bytes, chunks: AsyncIterable[bytes]) -> AsyncIterator[bytes]:
+    """
+    Decrypts an async iterator of stream pieces, yielding verified plaintext
+    """
+    decryptor = StreamDecryptor(key)
+    async for data in chunks:
+        out = decryptor.update(data)
+        if out:
+            yield out
+    yield decryptor.finalize()
@@ -1,7 +1,10 @@
 """module for clients"""
+import os
+import sys
 import socket
 import threading
 import random
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from utils import *
 import ast
 class Client:
@@ -1,7 +1,10 @@
 """module for a server"""
+import os
+import sys
 import socket
 import threading
 import re
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from utils import *
 import ast
 class Server:
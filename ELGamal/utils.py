@@ -3,12 +3,11 @@ import random
 import math
 from sympy import primitive_root
 
+from primes import prime_in_range
+
 def generate_prime(min_value, max_value) -> int:
     """Generates a random prime number in given range"""
-    prime = random.randint(min_value, max_value)
-    while not miller_rabin(prime):
-        prime += 1
-    return prime
+    return prime_in_range(min_value, max_value)
 
 def create_keys():
     """Creates public and private keys for a client"""
@@ -18,43 +17,6 @@ def create_keys():
     e = pow(g, secret_a, p)
     return p, g, e, secret_a
 
-def miller_rabin(n, k=100):
-    """
-    Function to check if a number is prime using Miller-Rabin primality test.
-
-    n: int - The number to check for primality.
-    k: int - The number of iterations for accuracy.
-    Returns True if n is probably prime, False if n is composite.
-    """
-    if n <= 1:
-        return False
-    if n <= 3:
-        return True
-    if n % 2 == 0:
-        return False
-
-    r, d = 0, n - 1
-    while d % 2 == 0:
-        d //= 2
-        r += 1
-
-    for _ in range(k):
-        a = random.randint(2, n - 2)
-        x = pow(a, d, n)
-
-        if x == 1 or x == n - 1:
-            continue
-
-        for _ in range(r - 1):
-            x = pow(x, 2, n)
-            if x == n - 1:
-                break
-        else:
-            return False
-
-    return True
-
-
 def encode_message(message, p, g, e):
     """
     Encodes a message using Elgamal block encryption.
@@ -0,0 +1,76 @@
+"""Byte-oriented RSA block mode.
+
+A message is cut into blocks of k - 11 bytes for a k-byte modulus. Each
+block is padded as in PKCS#1 v1.5 encryption (00 02, at least 8 random
+nonzero bytes, 00, the data), so every block is close to the modulus in
+size: short blocks cannot be recovered by taking a small root, and equal
+blocks do not encrypt the same. An encrypted block is exactly k bytes,
+so a ciphertext is the blocks one after another.
+"""
+import secrets
+
+PADDING = 11 # bytes of every block taken by the padding
+
+
+def block_size(mod):
+    """Function to get the size of an encrypted block in bytes."""
+    return (mod.bit_length() + 7) // 8
+
+
+def capacity(mod):
+    """Function to get how many message bytes fit into one block."""
+    return block_size(mod) - PADDING
+
+
+def _nonzero_bytes(n):
+    out = b''
+    while len(out) < n:
+        out += secrets.token_bytes(n + 8).replace(b'\x00', b'')
+    return out[:n]
+
+
+def pad(chunk, k):
+    """Function to turn up to k - 11 message bytes into a block integer."""
+    return int.from_bytes(b'\x00\x02' + _nonzero_bytes(k - 3 - len(chunk)) + b'\x00' + chunk)
+
+
+def unpad(block, k):
+    """Function to get the message bytes back from a decrypted block integer."""
+    raw = block.to_bytes(k)
+    separator = raw.find(0, 2)
+    if raw[:2] != b'\x00\x02' or separator < PADDING - 1:
+        raise ValueError('The message was damaged.')
+    return raw[separator + 1:]
+
+
+def encrypt(data, encrypt_key, mod):
+    """
+    Function to encrypt a message of any length.
+
+    data: bytes - The message.
+    encrypt_key, mod: int - The recipient's public key.
+    Returns the encrypted blocks as bytes, an empty message is one block.
+    """
+    k = block_size(mod)
+    size = k - PADDING
+    if size < 1:
+        raise ValueError('The modulus is too small for the block mode')
+    blocks = [pad(data[i:i + size], k) for i in range(0, max(len(data), 1), size)]
+    return b''.join(pow(block, encrypt_key, mod).to_bytes(k) for block in blocks)
+
+
+def decrypt(cipher, private_key):
+    """
+    Function to decrypt a message encrypted by encrypt.
+
+    cipher: bytes - The encrypted blocks.
+    private_key: PrivateKey - The recipient's key.
+    Returns the message bytes, ValueError if the blocks are damaged.
+    """
+    k = block_size(private_key.mod)
+    if not cipher or len(cipher) % k:
+        raise ValueError('The message was damaged.')
+    blocks = [int.from_bytes(cipher[i:i + k]) for i in range(0, len(cipher), k)]
+    if any(block >= private_key.mod for block in blocks):
+        raise ValueError('The message was damaged.')
+    return b''.join(unpad(private_key.decrypt(block), k) for block in blocks)
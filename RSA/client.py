@@ -1,17 +1,26 @@
 """Module for the client side of the chat application using RSA encryption."""
+import os
+import sys
 import socket
 import threading
 
-from utils import get_key, generate_key
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils import KEY_BITS, PrivateKey, prime_range
+from framing import int_bytes, recv_frame, send_frame
 from hashlib import sha256
+from hybrid import EnvelopeReader, SessionKey
+import blocks
 
 
 class Client:
     """Client class for the chat application."""
-    def __init__(self, server_ip: str, port: int, username: str) -> None:
+    def __init__(self, server_ip: str, port: int, username: str, key_bits: int = KEY_BITS,
+                 primes: int = 2) -> None:
         self.server_ip = server_ip
         self.port = port
         self.username = username
+        self.key_bits = key_bits
+        self.primes = primes # 3-4 for a multi-prime key of the same size
         self.running = True
 
     def init_connection(self):
@@ -23,23 +32,21 @@ class Client:
             print("[client]: could not connect to server: ", e)
             return
 
-        self.s.send(self.username.encode())
+        send_frame(self.s, self.username.encode())
 
         # create key pairs(prime numbers)
-        p, q = get_key(10**100, 10**101), get_key(10**100, 10**101)
-        self.mod = p * q
-        phi = (p - 1) * (q - 1)
-
-        encrypt_key = generate_key(phi)
-        self.decrypt_key = pow(encrypt_key, -1, phi)
+        self.private_key = PrivateKey.generate(*prime_range(self.key_bits, self.primes), count=self.primes)
 
         # exchange public keys
-        self.s.send(encrypt_key.to_bytes(128))
-        self.s.send(self.mod.to_bytes(128))
+        send_frame(self.s, int_bytes(self.private_key.encrypt_key))
+        send_frame(self.s, int_bytes(self.private_key.mod))
 
-        # receive the encrypted secret key
-        self.server_key = int.from_bytes(self.s.recv(128))
-        self.server_mod = int.from_bytes(self.s.recv(128))
+        self.server_key = int.from_bytes(recv_frame(self.s))
+        self.server_mod = int.from_bytes(recv_frame(self.s))
+        # the server chooses: RSA.hybrid envelopes or RSA.blocks for every message
+        self.hybrid = recv_frame(self.s) == b'hybrid'
+        self.session = SessionKey() # its wrap for the server key is computed once
+        self.reader = EnvelopeReader(self.private_key)
 
         message_handler = threading.Thread(target=self.read_handler,args=())
         message_handler.start()
@@ -49,56 +56,42 @@ class Client:
     def read_handler(self):
         """Method to handle incoming messages from the server."""
         while self.running:
-            if not self.s:
+            try:
+                cipher = recv_frame(self.s)
+                hashed = recv_frame(self.s)
+            except (ConnectionError, OSError):
                 break
 
-            message = int.from_bytes(self.s.recv(1024))
-            hashed = int.from_bytes(self.s.recv(128))
-
-            decrypted = str(pow(int(message), int(self.decrypt_key), int(self.mod)))
-
-            if len(decrypted) % 3 != 0:
-                decrypted = '0' + decrypted
-
-            curr_hashed = sha256(decrypted.encode())
-            if int(curr_hashed.hexdigest(), 16) != hashed:
+            if self.hybrid:
+                message = self.reader.open(cipher)
+            else:
+                message = blocks.decrypt(cipher, self.private_key)
+            if sha256(message).digest() != hashed:
                 raise ValueError('The message was damaged.')
 
-            message = ''
-            for i in range(0, len(decrypted), 3):
-                message += chr(int(decrypted[i:i + 3]))
+            print(message.decode())
 
-            print(message)
+    def send(self, message: str):
+        """Method to encrypt a message for the server and send it with its hash."""
+        data = message.encode()
+        if self.hybrid:
+            send_frame(self.s, self.session.encrypt(data, self.server_key, self.server_mod))
+        else:
+            send_frame(self.s, blocks.encrypt(data, self.server_key, self.server_mod))
+        send_frame(self.s, sha256(data).digest())
 
     def write_handler(self):
         """Method to handle sending messages to the server."""
         while self.running:
             message = input()
-            cipher = ''
             if message == 'q':
-                message = f'{self.username} has left the chat'
-                for char in message:
-                    cipher += f'{ord(char):03}'
-
-                hashed = sha256(cipher.encode())
-
-                crypted_msg = pow(int(cipher), int(self.server_key), int(self.server_mod))
-                self.s.send(crypted_msg.to_bytes(1024))
-                self.s.send(int(hashed.hexdigest(), 16).to_bytes(128))
+                self.send(f'{self.username} has left the chat')
                 print("You have left the chat")
                 self.running = False
+                self.s.close()
                 break
 
-            message = f'{self.username}: {message}'
-
-            for char in message:
-                cipher += f'{ord(char):03}'
-
-            hashed = sha256(cipher.encode())
-
-            crypted_msg = pow(int(cipher), int(self.server_key), int(self.server_mod))
-            self.s.send(crypted_msg.to_bytes(1024))
-            self.s.send(int(hashed.hexdigest(), 16).to_bytes(128))
+            self.send(f'{self.username}: {message}')
 
 
 if __name__ == "__main__":
@@ -0,0 +1,52 @@
+"""Length-prefixed frames over a TCP stream.
+
+TCP keeps no message boundaries: one recv can return half a message or
+two of them. Every frame is a 4-byte big-endian length and then the data,
+and it is read until it is complete. send_frame/recv_frame work on
+blocking sockets, pack_frame/read_frame on asyncio streams.
+"""
+import struct
+
+MAX_FRAME = 1 << 20 # bytes, larger frames are a broken or hostile peer
+
+
+def pack_frame(data):
+    """Function to build one frame."""
+    return struct.pack('>I', len(data)) + data
+
+
+def send_frame(sock, data):
+    """Function to send one frame."""
+    sock.sendall(pack_frame(data))
+
+
+def recv_exact(sock, size):
+    """Function to read exactly size bytes, ConnectionError if the peer closes first."""
+    data = bytearray()
+    while len(data) < size:
+        part = sock.recv(size - len(data))
+        if not part:
+            raise ConnectionError('The connection was closed')
+        data += part
+    return bytes(data)
+
+
+def recv_frame(sock):
+    """Function to read one frame."""
+    (size,) = struct.unpack('>I', recv_exact(sock, 4))
+    if size > MAX_FRAME:
+        raise ValueError('The frame is too large')
+    return recv_exact(sock, size)
+
+
+async def read_frame(reader):
+    """Function to read one frame from an asyncio stream, IncompleteReadError if the peer closes first."""
+    (size,) = struct.unpack('>I', await reader.readexactly(4))
+    if size > MAX_FRAME:
+        raise ValueError('The frame is too large')
+    return await reader.readexactly(size)
+
+
+def int_bytes(value):
+    """Function to encode a key number in as few bytes as it needs."""
+    return value.to_bytes((value.bit_length() + 7) // 8 or 1)
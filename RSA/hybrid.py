@@ -0,0 +1,93 @@
+"""Hybrid RSA envelopes for sending one message to many recipients.
+
+The message is encrypted once with AES-GCM under a session key and only
+that key is encrypted with RSA, once per recipient key. An envelope is
+
+    wrapped key: the session key in RSA blocks (RSA/blocks.py) of the recipient's key
+    nonce: 12 bytes
+    ciphertext, then the 16-byte tag
+
+A sender keeps a SessionKey and its wraps are cached by recipient key, so
+a message to n recipients costs one AES encryption and n lookups; RSA
+runs only for a recipient the session has not seen yet. A reader caches
+unwrapped keys by their wrapped bytes, so it runs RSA only when a sender
+starts a new session.
+"""
+from collections import OrderedDict
+
+from Crypto.Cipher import AES
+from Crypto.Random import get_random_bytes
+
+import blocks
+
+KEY_SIZE = 32
+NONCE_SIZE = 12
+TAG_SIZE = 16
+
+
+def wrapped_size(mod):
+    """Function to get the size of a wrapped session key for a modulus."""
+    size = blocks.capacity(mod)
+    return -(-KEY_SIZE // size) * blocks.block_size(mod)
+
+
+class SessionKey:
+    """Class for a symmetric key a sender uses until it is replaced, with its RSA wraps."""
+    def __init__(self):
+        self.key = get_random_bytes(KEY_SIZE)
+        self._wraps = {} # (encrypt_key, mod) -> wrapped key
+
+    def seal(self, data):
+        """
+        Function to encrypt a message once for any number of recipients.
+
+        Returns nonce, ciphertext and tag as bytes.
+        """
+        nonce = get_random_bytes(NONCE_SIZE)
+        ciphertext, tag = AES.new(self.key, AES.MODE_GCM, nonce=nonce).encrypt_and_digest(data)
+        return nonce + ciphertext + tag
+
+    def wrap(self, encrypt_key, mod):
+        """Function to get the session key encrypted for a recipient, cached."""
+        wrapped = self._wraps.get((encrypt_key, mod))
+        if wrapped is None:
+            wrapped = blocks.encrypt(self.key, encrypt_key, mod)
+            self._wraps[(encrypt_key, mod)] = wrapped
+        return wrapped
+
+    def encrypt(self, data, encrypt_key, mod):
+        """Function to build an envelope for one recipient."""
+        return self.wrap(encrypt_key, mod) + self.seal(data)
+
+
+class EnvelopeReader:
+    """Class opening envelopes sent to one private key."""
+    def __init__(self, private_key, cache_size=1024):
+        self.private_key = private_key
+        self.cache_size = cache_size # senders whose session keys are kept
+        self._keys = OrderedDict() # wrapped key -> session key
+        self._wrapped_size = wrapped_size(private_key.mod)
+
+    def open(self, envelope):
+        """
+        Function to decrypt an envelope.
+
+        Returns the message bytes, ValueError if the envelope is damaged.
+        """
+        if len(envelope) < self._wrapped_size + NONCE_SIZE + TAG_SIZE:
+            raise ValueError('The message was damaged.')
+        wrapped = envelope[:self._wrapped_size]
+        key = self._keys.get(wrapped)
+        if key is None:
+            key = blocks.decrypt(wrapped, self.private_key)
+            if len(key) != KEY_SIZE:
+                raise ValueError('The message was damaged.')
+            self._keys[wrapped] = key
+            while len(self._keys) > self.cache_size:
+                self._keys.popitem(last=False)
+        else:
+            self._keys.move_to_end(wrapped)
+
+        nonce = envelope[self._wrapped_size:self._wrapped_size + NONCE_SIZE]
+        cipher = AES.new(key, AES.MODE_GCM, nonce=nonce)
+        return cipher.decrypt_and_verify(envelope[self._wrapped_size + NONCE_SIZE:-TAG_SIZE], envelope[-TAG_SIZE:])
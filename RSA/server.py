@@ -1,79 +1,174 @@
-"""Main server file for the chat application."""
-import socket
-import threading
-
-from utils import get_key, generate_key
+"""Main server file for the chat application.
+
+One asyncio event loop serves every client. handle_client reads a
+client's frames; what is sent to a client goes through its Connection,
+a bounded queue emptied by the connection's own writer task, so a slow
+client never holds up the others. A client that falls OUTBOX_SIZE
+messages behind is disconnected.
+
+In hybrid mode (the default, announced to every client after the server
+key) messages travel as RSA.hybrid envelopes: a fanout is one AES
+encryption plus a cached key wrap per recipient. The session key is
+replaced whenever someone joins or leaves, so a client can read only
+what was sent while it was connected.
+"""
+import os
+import sys
+import asyncio
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils import KEY_BITS, MAX_KEY_BITS, MIN_KEY_BITS, PrivateKey, prime_range
+from framing import int_bytes, pack_frame, read_frame
 from hashlib import sha256
+from hybrid import EnvelopeReader, SessionKey
+import blocks
+
+OUTBOX_SIZE = 256 # messages waiting for one client before it is disconnected
+HANDSHAKE_TIMEOUT = 30.0 # seconds for a new client to send its name and key
+BACKLOG = 1024
+HYBRID, BLOCKS = b'hybrid', b'blocks' # message modes, sent after the server key
+
+
+class Connection:
+    """Class for one connected client: its public key and its writer task."""
+    def __init__(self, username: str, writer: asyncio.StreamWriter, client_key: int, client_mod: int) -> None:
+        self.username = username
+        self.writer = writer
+        self.client_key = client_key
+        self.client_mod = client_mod
+        self.outbox = asyncio.Queue(OUTBOX_SIZE)
+        self.task = asyncio.create_task(self._write())
+
+    def put(self, data: bytes) -> bool:
+        """Method to queue frames without waiting. Disconnects the client if it is too far behind."""
+        try:
+            self.outbox.put_nowait(data)
+            return True
+        except asyncio.QueueFull:
+            print(f"{self.username} is too slow, disconnecting")
+            self.writer.close() # its handle_client sees the end of the stream and cleans up
+            return False
+
+    async def close(self):
+        """Method to stop the writer task and close the socket."""
+        self.task.cancel()
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except (ConnectionError, OSError):
+            pass
+
+    async def _write(self):
+        try:
+            while True:
+                data = await self.outbox.get()
+                self.writer.write(data)
+                await self.writer.drain()
+        except (ConnectionError, OSError):
+            self.writer.close()
 
 
 class Server:
     """Class for the chat server."""
-    def __init__(self, port: int) -> None:
+    def __init__(self, port: int, key_bits: int = KEY_BITS, primes: int = 2, hybrid: bool = True) -> None:
         self.host = '127.0.0.1'
         self.port = port
-        self.clients = []
-        self.client_keys = {}
-        self.s = socket.socket(socket.AF_INET,socket.SOCK_STREAM)
+        self.key_bits = key_bits
+        self.primes = primes # 3-4 for a multi-prime key of the same size
+        self.hybrid = hybrid # RSA.hybrid envelopes instead of RSA.blocks for every message
+        self.clients = set() # Connection objects, only touched from the event loop
+        self.session = SessionKey()
 
     def start(self):
         """Method to start the server."""
-        self.s.bind((self.host, self.port))
-        self.s.listen(100)
-
-        p, q = get_key(10**100, 10**101), get_key(10**100, 10**101)
-        self.mod = p * q
-        phi = (p - 1) * (q - 1)
-
-        self.encrypt_key = generate_key(phi) # public key for the server
-        self.decrypt_key = pow(self.encrypt_key, -1, phi) # private key for the server
-
-        while True:
-            c, addr = self.s.accept()
-            username = c.recv(1024).decode()
-            print(f"{username} tries to connect")
-            self.clients.append(c)
-
-            client_key = int.from_bytes(c.recv(128))
-            client_mod = int.from_bytes(c.recv(128))
-
-            self.client_keys[c] = (client_key, client_mod)
-
-            c.send(self.encrypt_key.to_bytes(128))
-            c.send(self.mod.to_bytes(128))
-
-            self.broadcast(f'new person has joined: {username}')
-
-            threading.Thread(target=self.handle_client,args=(c,addr,)).start()
+        asyncio.run(self.serve())
+
+    async def serve(self):
+        """Method to generate the server key and serve clients until cancelled."""
+        # blinded: any client can send the server ciphertexts of its choice
+        self.private_key = PrivateKey.generate(*prime_range(self.key_bits, self.primes),
+                                               blinding=True, count=self.primes)
+        self.mod = self.private_key.mod
+        self.encrypt_key = self.private_key.encrypt_key # public key for the server
+        self.reader = EnvelopeReader(self.private_key) # clients' session keys, unwrapped once
+
+        server = await asyncio.start_server(self.handle_client, self.host, self.port, backlog=BACKLOG)
+        async with server:
+            try:
+                await server.serve_forever()
+            finally:
+                await asyncio.gather(*(client.close() for client in list(self.clients)))
 
     def broadcast(self, msg: str):
         """Method to broadcast a message to all clients."""
-        for client in self.clients:
-            cipher = ''
-            for char in msg:
-                cipher += f'{ord(char):03}'
-            cipher = int(cipher)
-
-            client_key, client_mod = self.client_keys[client]
-            hashed = sha256(str(cipher).encode())
+        data = msg.encode()
+        self.fanout(list(self.clients), data, sha256(data).digest())
+
+    def fanout(self, recipients: list, data: bytes, hashed: bytes):
+        """Method to encrypt a message for several clients and queue it with its hash."""
+        hash_frame = pack_frame(hashed)
+        if self.hybrid:
+            payload = self.session.seal(data) # once for everyone
+            for client in recipients:
+                wrapped = self.session.wrap(client.client_key, client.client_mod)
+                client.put(pack_frame(wrapped + payload) + hash_frame) # one item: the two frames stay together
+            return
+        for client in recipients:
+            cipher = blocks.encrypt(data, client.client_key, client.client_mod)
+            client.put(pack_frame(cipher) + hash_frame)
+
+    def decrypt(self, cipher: bytes) -> bytes:
+        """Method to decrypt a message from a client, ValueError if it is damaged."""
+        if self.hybrid:
+            return self.reader.open(cipher)
+        return blocks.decrypt(cipher, self.private_key)
+
+    async def handshake(self, reader: asyncio.StreamReader):
+        """Method to read the name and the public key of a new client, ValueError if the key is unusable."""
+        username = (await read_frame(reader)).decode()
+        client_key = int.from_bytes(await read_frame(reader))
+        client_mod = int.from_bytes(await read_frame(reader))
+        # every fanout encrypts for this key, a bad one would fail it for everyone
+        if not MIN_KEY_BITS <= client_mod.bit_length() <= MAX_KEY_BITS:
+            raise ValueError('Client modulus has a wrong size')
+        if not 3 <= client_key < client_mod:
+            raise ValueError('Client public exponent is out of range')
+        return username, client_key, client_mod
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Method to handle incoming messages from a client."""
+        try:
+            username, client_key, client_mod = await asyncio.wait_for(self.handshake(reader), HANDSHAKE_TIMEOUT)
+        except (asyncio.TimeoutError, EOFError, ConnectionError, ValueError):
+            writer.close()
+            return
+        print(f"{username} tries to connect")
+
+        client = Connection(username, writer, client_key, client_mod)
+        try:
+            client.put(pack_frame(int_bytes(self.encrypt_key)) + pack_frame(int_bytes(self.mod))
+                       + pack_frame(HYBRID if self.hybrid else BLOCKS))
+            self.clients.add(client)
+            self.session = SessionKey()
+            self.broadcast(f'new person has joined: {username}')
 
-            crypted_msg = pow(cipher, client_key, client_mod)
-            client.send(crypted_msg.to_bytes(1024))
-            client.send(int(hashed.hexdigest(), 16).to_bytes(128))
+            while True:
+                cipher = await read_frame(reader)
+                hashed = await read_frame(reader)
+                try:
+                    data = self.decrypt(cipher)
+                except ValueError:
+                    continue # damaged, the recipients could not check it anyway
+
+                self.fanout([other for other in self.clients if other is not client], data, hashed)
+        except (EOFError, ConnectionError, ValueError):
+            pass # disconnected, or a frame no client would send
+        finally:
+            self.clients.discard(client)
+            self.session = SessionKey()
+            await client.close()
+            print(f"{username} has disconnected")
 
-    def handle_client(self, c: socket, addr):
-        """Method to handle incoming messages from a client."""
-        while True:
-            msg = int.from_bytes(c.recv(1024))
-            hashed = c.recv(128)
-            crypted = int(msg)
-            decrypted = pow(crypted, int(self.decrypt_key), int(self.mod))
-
-            for client in self.clients:
-                if client != c:
-                    client_key, client_mod = self.client_keys[client]
-                    crypted_msg = pow(int(decrypted), client_key, client_mod)
-                    client.send(crypted_msg.to_bytes(1024))
-                    client.send(hashed)
 
 if __name__ == "__main__":
     s = Server(9001)
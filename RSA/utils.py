@@ -1,42 +1,11 @@
 """Crypto utility functions for RSA encryption."""
-import random
+import secrets
 from math import gcd
 
-def miller_rabin(n, k=100):
-    """
-    Function to check if a number is prime using Miller-Rabin primality test.
-
-    n: int - The number to check for primality.
-    k: int - The number of iterations for accuracy.
-    Returns True if n is probably prime, False if n is composite.
-    """
-    if n <= 1:
-        return False
-    if n <= 3:
-        return True
-    if n % 2 == 0:
-        return False
-
-    r, d = 0, n - 1
-    while d % 2 == 0:
-        d //= 2
-        r += 1
+from primes import prime_in_range
 
-    for _ in range(k):
-        a = random.randint(2, n - 2)
-        x = pow(a, d, n)
-
-        if x == 1 or x == n - 1:
-            continue
-
-        for _ in range(r - 1):
-            x = pow(x, 2, n)
-            if x == n - 1:
-                break
-        else:
-            return False
-
-    return True
+KEY_BITS = 2048 # modulus size of the chat keys
+MIN_KEY_BITS, MAX_KEY_BITS = 1024, 4096 # what a peer's key may have
 
 
 def get_key(min_value, max_value):
@@ -45,12 +14,7 @@ def get_key(min_value, max_value):
     
     Returns a prime number that is ~100 digits long.
     """
-    num = random.randint(min_value, max_value)
-    while True:
-        if miller_rabin(num):
-            return num
-
-        num += 1
+    return prime_in_range(min_value, max_value)
 
 
 def generate_key(phi):
@@ -62,3 +26,112 @@ def generate_key(phi):
     for i in range(2, phi):
         if gcd(i, phi) == 1:
             return i
+
+
+def _iroot(n, k):
+    """Function to compute the integer k-th root of n, rounded down."""
+    x = 1 << -(-n.bit_length() // k)
+    while True:
+        y = ((k - 1) * x + n // x ** (k - 1)) // k
+        if y >= x:
+            return x
+        x = y
+
+
+def prime_range(bits, count=2):
+    """
+    Function to get the range for primes of a modulus of exactly `bits` bits.
+
+    count: int - How many primes the modulus is the product of.
+    Returns (min_value, max_value) for get_key.
+    """
+    return _iroot(2 ** (bits - 1) - 1, count) + 1, _iroot(2 ** bits - 1, count)
+
+
+class PrivateKey:
+    """
+    Class for an RSA private key kept in CRT form.
+
+    Decryption is two exponentiations modulo p and q with exponents of half
+    the size instead of one modulo n, about 3-4 times faster. With blinding
+    the ciphertext is multiplied by r^e first and the result by r^-1, so the
+    time of a decryption does not depend on the ciphertext an attacker sent.
+    The pair (r^e, r^-1) is refreshed by squaring, one inverse per key.
+
+    A multi-prime key (RFC 8017) has more primes in `others`. Each extra
+    prime r adds one exponentiation modulo r with d mod (r - 1), and the
+    results are combined one prime at a time with t = (p*q*...)^-1 mod r.
+    """
+    def __init__(self, p, q, encrypt_key, blinding=False, others=()):
+        primes = (p, q, *others)
+        if len(set(primes)) != len(primes):
+            raise ValueError('The primes must be different')
+        self.p, self.q = p, q
+        self.mod = 1
+        phi = 1
+        for prime in primes:
+            self.mod *= prime
+            phi *= prime - 1
+        self.encrypt_key = encrypt_key
+        self.decrypt_key = pow(encrypt_key, -1, phi)
+        self.dp = self.decrypt_key % (p - 1)
+        self.dq = self.decrypt_key % (q - 1)
+        self.qinv = pow(q, -1, p)
+
+        self.others = [] # (r, d mod (r - 1), t) for every extra prime
+        product = p * q
+        for prime in others:
+            self.others.append((prime, self.decrypt_key % (prime - 1), pow(product, -1, prime)))
+            product *= prime
+
+        self.blinding = blinding
+        self._blind = self._new_blind() if blinding else None
+
+    @classmethod
+    def generate(cls, min_value, max_value, blinding=False, count=2):
+        """
+        Function to generate a key from `count` different primes in [min_value, max_value].
+
+        The public exponent is the smallest one coprime with phi, as before.
+        Take the range from prime_range(bits, count) for a modulus of bits bits.
+        """
+        primes = []
+        while len(primes) < count:
+            prime = get_key(min_value, max_value)
+            if prime not in primes:
+                primes.append(prime)
+        phi = 1
+        for prime in primes:
+            phi *= prime - 1
+        return cls(primes[0], primes[1], generate_key(phi), blinding, primes[2:])
+
+    def decrypt(self, cipher):
+        """
+        Function to decrypt one block.
+
+        cipher: int - The ciphertext, below mod.
+        Returns the plaintext as an int.
+        """
+        if not self.blinding:
+            return self._crt(cipher)
+        blind, unblind = self._blind
+        self._blind = (blind * blind % self.mod, unblind * unblind % self.mod)
+        return self._crt(cipher * blind % self.mod) * unblind % self.mod
+
+    def _crt(self, cipher):
+        m1 = pow(cipher % self.p, self.dp, self.p)
+        m2 = pow(cipher % self.q, self.dq, self.q)
+        h = self.qinv * (m1 - m2) % self.p
+        message = m2 + h * self.q
+        product = self.p * self.q
+        for prime, exponent, t in self.others:
+            mi = pow(cipher % prime, exponent, prime)
+            message += product * ((mi - message) * t % prime)
+            product *= prime
+        return message
+
+    def _new_blind(self):
+        while True:
+            r = secrets.randbelow(self.mod - 2) + 2
+            if gcd(r, self.mod) == 1:
+                return pow(r, self.encrypt_key, self.mod), pow(r, -1, self.mod)
@@ -1,49 +1,17 @@
 '''Rabin's algorithm for public key cryptography'''''
-import random
+import os
+import sys
 import time
 
-def miller_rabin(n, k=100):
-    """
-    Function to check if a number is prime using Miller-Rabin primality test.
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from primes import prime_in_range
 
-    n: int - The number to check for primality.
-    k: int - The number of iterations for accuracy.
-    Returns True if n is probably prime, False if n is composite.
-    """
-    if n <= 1:
-        return False
-    if n <= 3:
-        return True
-    if n % 2 == 0:
-        return False
 
-    r, d = 0, n - 1
-    while d % 2 == 0:
-        d //= 2
-        r += 1
-
-    for _ in range(k):
-        a = random.randint(2, n - 2)
-        x = pow(a, d, n)
-
-        if x == 1 or x == n - 1:
-            continue
-
-        for _ in range(r - 1):
-            x = pow(x, 2, n)
-            if x == n - 1:
-                break
-        else:
-            return False
-
-    return True
 def generate_keys(min_value, max_value):
     # Ensure p ≡ q ≡ 3 mod 4
-    p = q = 4
-    while not (miller_rabin(p) and p % 4 == 3):
-        p = random.randint(min_value, max_value)
-    while not (miller_rabin(q) and q % 4 == 3) or q == p:
-        q = random.randint(min_value, max_value)
+    p = q = prime_in_range(min_value, max_value, residue=3, modulus=4)
+    while q == p:
+        q = prime_in_range(min_value, max_value, residue=3, modulus=4)
     n = p * q
     return (n, p, q)
 
@@ -0,0 +1,98 @@
+"""Offline check of the multi-worker backend: a broker and two BrokerBackends in one process"""
+import asyncio
+import os
+import sys
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from relay.broker import Broker
+from relay.presence import Presence
+from relay.routing import BrokerBackend
+
+
+class FakeSocket:
+    """Stands in for a WebSocket, records what was sent"""
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.frames = []
+        self.closed = None
+
+    async def send_text(self, text):
+        await asyncio.sleep(self.delay)
+        self.frames.append(text)
+
+    async def send_bytes(self, data):
+        await asyncio.sleep(self.delay)
+        self.frames.append(data)
+
+    async def close(self, code=1000):
+        self.closed = code
+
+
+async def noop(_):
+    pass
+
+
+async def settle():
+    await asyncio.sleep(0.1)
+
+
+async def check(path):
+    broker = asyncio.create_task(Broker().serve(path))
+    await settle()
+    first, second = BrokerBackend(Presence(noop), path), BrokerBackend(Presence(noop), path)
+    await first.start()
+    await second.start()
+
+    alice, bob, carol = FakeSocket(), FakeSocket(), FakeSocket(delay=1.0)
+    assert await first.register("alice", alice, "ka", 5)
+    assert await second.register("bob", bob, "kb", 7)
+    assert await first.register("carol", carol, "kc", 9)
+    assert not await second.register("alice", FakeSocket(), "kx", 1), "duplicate name accepted"
+    await settle()
+    assert second.keys("alice") == ("ka", 5) and first.keys("bob") == ("kb", 7)
+    print("claims and directory replication: ok")
+
+    ## carol's socket is slow, alice must not wait behind her
+    assert await second.deliver("carol", "slow")
+    assert await second.deliver("alice", b"\x01frame")
+    assert await second.deliver("alice", "text")
+    await settle()
+    assert alice.frames == [b"\x01frame", "text"], alice.frames
+    assert carol.frames == []
+    print("cross-worker delivery, in order and not held up by a slow socket: ok")
+
+    await second.unregister("bob")
+    await settle()
+    assert not first.is_online("bob")
+    print("release: ok")
+
+    broker.cancel()
+    await asyncio.gather(broker, return_exceptions=True)
+    for backend in (first, second):
+        backend._writer.transport.abort() ## the broker process is gone
+    await settle()
+    assert alice.closed == 1012 and not first.is_online("alice")
+    try:
+        await asyncio.wait_for(second.register("dave", FakeSocket(), "kd", 3), 1)
+        raise AssertionError("register succeeded without a broker")
+    except ConnectionError:
+        pass
+    print("broker loss closes local users and fails claims: ok")
+
+    broker = asyncio.create_task(Broker().serve(path))
+    await asyncio.sleep(1.5) ## RECONNECT_DELAY
+    assert await second.register("dave", FakeSocket(), "kd", 3)
+    await settle()
+    assert first.is_online("dave")
+    print("reconnect: ok")
+
+    await first.stop()
+    await second.stop()
+    broker.cancel()
+    await asyncio.gather(broker, return_exceptions=True)
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as directory:
+        asyncio.run(check(os.path.join(directory, "broker.sock")))
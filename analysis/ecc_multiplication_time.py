@@ -0,0 +1,66 @@
+"""Compares the average time of affine, Jacobian w-NAF and fixed-base ECC scalar multiplication"""
+import time
+import sys
+import os
+import random
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import ECC.client, ECC.utils
+
+
+def make_point():
+    """Returns a random point on a random curve, as ECC.create_keys does"""
+    curve = ECC.client.Curve(ECC.utils.get_prime(), ECC.utils.get_prime(), ECC.utils.get_prime())
+    return ECC.client.Point.get_valid_point(curve)
+
+
+def mul_time_affine(point, scalars):
+    """Returns an average time of affine double-and-add multiplication"""
+    start_time = time.time()
+    for k in scalars:
+        point.multiply_affine(k)
+    return (time.time() - start_time) / len(scalars)
+
+
+def mul_time_jacobian(point, scalars):
+    """Returns an average time of Jacobian w-NAF multiplication"""
+    start_time = time.time()
+    for k in scalars:
+        point * k
+    return (time.time() - start_time) / len(scalars)
+
+
+def table_time(point):
+    """Returns the time to build the fixed-base table of a point, paid once per point"""
+    start_time = time.time()
+    point.multiply_base(1)
+    return time.time() - start_time
+
+
+def mul_time_fixed_base(point, scalars):
+    """Returns an average time of multiplication through the fixed-base table, already built"""
+    start_time = time.time()
+    for k in scalars:
+        point.multiply_base(k)
+    return (time.time() - start_time) / len(scalars)
+
+
+if __name__ == "__main__":
+    iters = 200
+    G = make_point()
+    ks = [ECC.utils.get_prime() for _ in range(iters)]
+    assert all((G * k).x == G.multiply_affine(k).x == G.multiply_base(k).x for k in random.sample(ks, 5))
+
+    affine_time = mul_time_affine(G, ks)
+    jacobian_time = mul_time_jacobian(G, ks)
+    H = make_point() # a point without a table yet
+    build_time = table_time(H)
+    fixed_time = mul_time_fixed_base(H, ks)
+    print(f"Affine double-and-add: {affine_time:.6f} s")
+    print(f"Jacobian w-NAF:        {jacobian_time:.6f} s")
+    print(f"Fixed-base table:      {fixed_time:.6f} s")
+    print(f"Speedup w-NAF:         {affine_time / jacobian_time:.2f}x")
+    print(f"Table build (once):    {build_time:.6f} s")
+    print(f"Speedup fixed-base:    {jacobian_time / fixed_time:.2f}x over w-NAF")
+    ## a table pays off only for a point multiplied more often than this, like a named curve generator
+    print(f"Break-even:            {build_time / max(jacobian_time - fixed_time, 1e-12):.1f} multiplications")
@@ -0,0 +1,77 @@
+"""Measures throughput and peak memory of the chunked AES-GCM stream (ECC/stream.py) from 1 MB to 1 GB"""
+import argparse
+import resource
+import time
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import ECC.stream
+
+MB = 1024 * 1024
+SIZES = [1 * MB, 16 * MB, 128 * MB, 1024 * MB]
+
+
+class Source:
+    """Readable file object returning `size` bytes without holding them"""
+    def __init__(self, size, block=os.urandom(MB)):
+        self.left = size
+        self.block = block
+
+    def read(self, n):
+        n = min(n, self.left, len(self.block))
+        self.left -= n
+        return self.block[:n]
+
+
+class Sink:
+    """Writable file object that only counts"""
+    def __init__(self):
+        self.size = 0
+
+    def write(self, data):
+        self.size += len(data)
+
+
+def peak_rss_mb():
+    """Peak resident memory of the process so far (ru_maxrss is in KiB on Linux)"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run(size, chunk_size, key):
+    """Returns encrypt and round trip (encrypt piped into decrypt) throughput in MB/s.
+    Nothing is stored between the two, so memory stays flat at every size."""
+    start_time = time.perf_counter()
+    ECC.stream.encrypt_file(key, Source(size), Sink(), chunk_size)
+    encrypt = size / MB / (time.perf_counter() - start_time)
+
+    source, sink = Source(size), Sink()
+    encryptor = ECC.stream.StreamEncryptor(key, chunk_size)
+    decryptor = ECC.stream.StreamDecryptor(key)
+    start_time = time.perf_counter()
+    while True:
+        data = source.read(chunk_size)
+        if not data:
+            break
+        sink.write(decryptor.update(encryptor.update(data)))
+    sink.write(decryptor.update(encryptor.finalize()))
+    sink.write(decryptor.finalize())
+    assert sink.size == size
+    round_trip = size / MB / (time.perf_counter() - start_time)
+    return encrypt, round_trip
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chunk-size", type=int, default=ECC.stream.CHUNK_SIZE)
+    parser.add_argument("--max-size", type=int, default=1024, help="largest input in MB")
+    args = parser.parse_args()
+
+    key = os.urandom(32)
+    print(f"chunk size {args.chunk_size} B, baseline peak RSS {peak_rss_mb():.1f} MB")
+    print(f"{'input MB':>9} {'encrypt MB/s':>13} {'round trip MB/s':>16} {'peak RSS MB':>12}")
+    for size in SIZES:
+        if size > args.max_size * MB:
+            break
+        encrypt, round_trip = run(size, args.chunk_size, key)
+        print(f"{size // MB:>9} {encrypt:>13.1f} {round_trip:>16.1f} {peak_rss_mb():>12.1f}")
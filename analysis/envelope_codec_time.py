@@ -0,0 +1,31 @@
+"""Compares encode/decode time and frame size of the binary envelope and the old JSON format"""
+import time
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import envelope
+
+SIZES = [16, 256, 4096, 65536]
+
+
+def average_time(func, arg, iterations):
+    """Returns an average time of one call"""
+    start_time = time.perf_counter()
+    for _ in range(iterations):
+        func(*arg)
+    return (time.perf_counter() - start_time) / iterations
+
+
+if __name__ == "__main__":
+    print(f"{'size':>7} {'format':>7} {'frame':>8} {'encode us':>10} {'decode us':>10}")
+    for size in SIZES:
+        fields = ("alice", "bob", os.urandom(size), os.urandom(16), (2**159 + 1, 2**159 + 3), 2**1023 + 5)
+        iters = max(50, 200_000 // size)
+        for name, encode, decode in (("json", envelope.encode_json, envelope.decode_json),
+                                     ("binary", envelope.encode_message, envelope.decode_message)):
+            frame = encode(*fields)
+            assert decode(frame) == fields
+            enc = average_time(encode, fields, iters) * 1e6
+            dec = average_time(decode, (frame,), iters) * 1e6
+            print(f"{size:>7} {name:>7} {len(frame):>8} {enc:>10.2f} {dec:>10.2f}")
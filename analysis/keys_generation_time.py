@@ -72,6 +72,17 @@ def key_gen_time_ecc(min_val, max_val, iterations):
     average_time = sum(result)/len(result)
     return average_time
 
+def key_gen_time_ecc_curves(curve_names, iterations):
+    """Returns an average time of ECC.create_keys for each curve, None is a new random curve"""
+    results = {}
+    for name in curve_names:
+        ECC.client.ECC.create_keys(name) ## builds the cached curve and its tables once
+        start_time = time.time()
+        for _ in range(iterations):
+            ECC.client.ECC.create_keys(name)
+        results[name] = (time.time() - start_time) / iterations
+    return results
+
 if __name__ == "__main__":
     min_value, max_value = 10**50, 10**51
     iters = 100
@@ -81,3 +92,5 @@ if __name__ == "__main__":
     # print(rsa_time)
     # elg_time = key_gen_time_elgamal(min_value, max_value, iters)
     # print(elg_time)
+    # for name, ecc_time in key_gen_time_ecc_curves([None, "secp256r1", "secp256k1"], iters).items():
+    #     print(f"ECC create_keys ({name or 'random curve'}): {ecc_time:.6f} s")
@@ -0,0 +1,239 @@
+"""Load harness for the relay: simulated clients on localhost, throughput and delivery latency percentiles
+
+Starts main.py with uvicorn on 127.0.0.1 (a subprocess by default, or a
+thread with --in-process), connects --clients websocket clients, and lets
+each send binary envelopes to random other clients at --rate messages per
+second. --churn clients per second disconnect and reconnect meanwhile.
+Every frame carries its send time, so the receiver measures delivery
+latency. Nothing leaves the machine.
+
+    python analysis/load_test.py --clients 2000 --rate 2 --size 512 --duration 20 --output load.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+from envelope import encode_header
+
+import websockets
+
+CONNECT_BATCH = 100 # clients connecting at the same time
+
+
+def percentile(values, share):
+    """Nearest-rank percentile of sorted values"""
+    if not values:
+        return None
+    return values[min(len(values) - 1, max(0, round(share * len(values)) - 1))]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(port, in_process, env):
+    """Runs the relay on 127.0.0.1:port, returns a function that stops it"""
+    if in_process:
+        os.environ.update(env)
+        os.chdir(ROOT)
+        import uvicorn
+        import main
+        server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=port, log_level="warning"))
+        threading.Thread(target=server.run, daemon=True).start()
+        while not server.started:
+            time.sleep(0.05)
+        return lambda: setattr(server, "should_exit", True)
+
+    process = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1",
+                                "--port", str(port), "--log-level", "warning"],
+                               cwd=ROOT, env={**os.environ, **env},
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 20
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            break
+        except OSError:
+            time.sleep(0.1)
+    else:
+        process.kill()
+        raise RuntimeError("the relay did not start")
+
+    def stop():
+        process.terminate()
+        process.wait()
+    return stop
+
+
+class Client:
+    """One simulated user"""
+    def __init__(self, harness, username):
+        self.harness = harness
+        self.username = username
+        self.websocket = None
+        self.reader = None
+
+    async def connect(self):
+        self.websocket = await websockets.connect(self.harness.url + self.username, max_size=None)
+        await self.websocket.send(json.dumps({"public_key": str(os.urandom(32)), "y": random.getrandbits(1023)}))
+        self.reader = asyncio.create_task(self.read())
+        self.harness.online.add(self.username)
+
+    async def disconnect(self):
+        self.harness.online.discard(self.username)
+        self.reader.cancel()
+        await self.websocket.close()
+
+    async def read(self):
+        stats = self.harness
+        try:
+            async for frame in self.websocket:
+                if isinstance(frame, bytes):
+                    (sent_at,) = struct.unpack_from(">Q", frame, len(frame) - stats.size)
+                    stats.latencies.append(time.monotonic_ns() - sent_at)
+                elif frame.startswith("✅"):
+                    stats.acked += 1
+                elif frame.startswith(("❌", "📥")):
+                    stats.misses += 1
+        except websockets.ConnectionClosed:
+            pass
+
+    async def send(self, recipient):
+        body = struct.pack(">Q", time.monotonic_ns()) + bytes(self.harness.size - 8)
+        await self.websocket.send(encode_header(self.username, recipient) + body)
+        self.harness.sent += 1
+
+
+class Harness:
+    """Drives the clients and collects the numbers"""
+    def __init__(self, url, args):
+        self.url = url
+        self.size = max(8, args.size)
+        self.args = args
+        self.clients = [Client(self, f"load{i}") for i in range(args.clients)]
+        self.online = set()
+        self.latencies = []
+        self.sent = self.acked = self.misses = self.errors = self.reconnects = 0
+
+    async def connect_all(self):
+        for start in range(0, len(self.clients), CONNECT_BATCH):
+            await asyncio.gather(*(client.connect() for client in self.clients[start:start + CONNECT_BATCH]))
+
+    async def sender(self, client, stop_at):
+        interval = 1 / self.args.rate
+        await asyncio.sleep(random.random() * interval) ## spread the clients over the interval
+        while time.monotonic() < stop_at:
+            if client.username in self.online and len(self.online) > 1:
+                recipient = random.choice(self.clients).username
+                if recipient != client.username:
+                    try:
+                        await client.send(recipient)
+                    except websockets.ConnectionClosed:
+                        pass # reconnecting by churn
+                    except Exception:
+                        self.errors += 1
+            await asyncio.sleep(interval)
+
+    async def churn(self, stop_at):
+        if not self.args.churn:
+            return
+        interval = 1 / self.args.churn
+        while time.monotonic() < stop_at:
+            await asyncio.sleep(interval)
+            client = random.choice(self.clients)
+            if client.username not in self.online:
+                continue
+            try:
+                await client.disconnect()
+                await asyncio.sleep(0.06) ## let the presence window pass, the name is free again
+                await client.connect()
+                self.reconnects += 1
+            except Exception:
+                self.errors += 1
+
+    async def run(self):
+        start = time.monotonic()
+        await self.connect_all()
+        connect_time = time.monotonic() - start
+        await asyncio.sleep(0.5) ## presence updates settle
+
+        start = time.monotonic()
+        stop_at = start + self.args.duration
+        await asyncio.gather(self.churn(stop_at), *(self.sender(client, stop_at) for client in self.clients))
+        elapsed = time.monotonic() - start
+        await asyncio.sleep(1) ## frames still on their way
+
+        for client in self.clients:
+            if client.username in self.online:
+                await client.disconnect()
+
+        latencies = sorted(ns / 1e6 for ns in self.latencies)
+        return {
+            "clients": self.args.clients,
+            "connect_seconds": round(connect_time, 3),
+            "sent": self.sent,
+            "delivered": len(latencies),
+            "acknowledged": self.acked,
+            "misses": self.misses,
+            "errors": self.errors,
+            "reconnects": self.reconnects,
+            "throughput_msg_s": round(len(latencies) / elapsed, 1),
+            "latency_ms": {name: None if value is None else round(value, 3) for name, value in (
+                ("p50", percentile(latencies, 0.50)), ("p95", percentile(latencies, 0.95)),
+                ("p99", percentile(latencies, 0.99)), ("max", latencies[-1] if latencies else None))},
+        }
+
+
+def commit_id():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=500)
+    parser.add_argument("--rate", type=float, default=2.0, help="messages per second per client")
+    parser.add_argument("--size", type=int, default=256, help="message body bytes")
+    parser.add_argument("--churn", type=float, default=0.0, help="reconnects per second over all clients")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of sending")
+    parser.add_argument("--in-process", action="store_true", help="run the relay in this process")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    wanted = 2 * args.clients + 256 ## both ends of every connection with --in-process
+    if soft < wanted:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(wanted, hard), hard))
+
+    port = free_port()
+    with tempfile.TemporaryDirectory() as offline_dir:
+        stop = start_server(port, args.in_process, {"CHAT_OFFLINE_DIR": offline_dir})
+        try:
+            results = asyncio.run(Harness(f"ws://127.0.0.1:{port}/ws/", args).run())
+        finally:
+            stop()
+
+    report = {"commit": commit_id(), "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+              "config": {name: value for name, value in vars(args).items() if name != "output"},
+              "results": results}
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
@@ -0,0 +1,52 @@
+"""Compares relay CPU per message: JSON parse and re-encode vs. header-only routing"""
+import time
+import sys
+import os
+import json
+import base64
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from envelope import encode_header, read_route
+
+SIZES = [64, 1024, 16 * 1024, 256 * 1024, 1024 * 1024]
+
+
+def json_message(size):
+    """Builds a message the way client_ui.py sends it: str(bytes) inside JSON"""
+    ciphertext, iv = os.urandom(size), base64.b64encode(os.urandom(16))
+    return json.dumps(("alice", "bob", str(ciphertext), str(iv), (2**159, 2**159), 2**1023))
+
+
+def binary_frame(size):
+    """Builds a binary envelope with an opaque body of the given size"""
+    return encode_header("alice", "bob") + os.urandom(size)
+
+
+def relay_json(text):
+    """What the relay used to do: parse, unpack, re-encode"""
+    data = json.loads(text)
+    sender, recipient, message, iv, signature, y = data
+    return recipient, json.dumps(data)
+
+
+def relay_binary(frame):
+    """Header-only routing: the frame is forwarded as it is"""
+    _, recipient, _ = read_route(frame)
+    return recipient, frame
+
+
+def messages_per_second(relay, message, iterations):
+    """Returns how many messages per second the relay function handles"""
+    start_time = time.perf_counter()
+    for _ in range(iterations):
+        relay(message)
+    return iterations / (time.perf_counter() - start_time)
+
+
+if __name__ == "__main__":
+    print(f"{'size':>10} {'json msg/s':>14} {'binary msg/s':>14} {'speedup':>9}")
+    for size in SIZES:
+        iters = max(20, 2_000_000 // size)
+        json_rate = messages_per_second(relay_json, json_message(size), iters)
+        binary_rate = messages_per_second(relay_binary, binary_frame(size), iters)
+        print(f"{size:>10} {json_rate:>14.0f} {binary_rate:>14.0f} {binary_rate / json_rate:>8.1f}x")
@@ -0,0 +1,41 @@
+"""Measures RSA block mode (RSA/blocks.py) encryption and decryption time over key sizes and message lengths"""
+import os
+import time
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import RSA.utils
+import RSA.blocks
+
+KEY_SIZES = [1024, 2048, 3072, 4096]
+MESSAGE_SIZES = [16, 256, 4096, 65536]
+
+
+def average_time(func, args, iterations):
+    """Returns an average time of one call"""
+    start_time = time.perf_counter()
+    for _ in range(iterations):
+        func(*args)
+    return (time.perf_counter() - start_time) / iterations
+
+
+if __name__ == "__main__":
+    print(f"{'key bits':>8} {'keygen s':>9} {'message':>8} {'blocks':>7} {'cipher B':>9}"
+          f" {'encrypt ms':>11} {'decrypt ms':>11} {'decrypt KB/s':>13}")
+    for bits in KEY_SIZES:
+        start_time = time.perf_counter()
+        key = RSA.utils.PrivateKey.generate(*RSA.utils.prime_range(bits), blinding=True)
+        keygen = time.perf_counter() - start_time
+        assert key.mod.bit_length() == bits
+
+        for size in MESSAGE_SIZES:
+            message = os.urandom(size)
+            cipher = RSA.blocks.encrypt(message, key.encrypt_key, key.mod)
+            assert RSA.blocks.decrypt(cipher, key) == message
+            blocks = len(cipher) // RSA.blocks.block_size(key.mod)
+            iterations = max(1, 64 // blocks)
+
+            enc = average_time(RSA.blocks.encrypt, (message, key.encrypt_key, key.mod), iterations)
+            dec = average_time(RSA.blocks.decrypt, (cipher, key), iterations)
+            print(f"{bits:>8} {keygen:>9.2f} {size:>8} {blocks:>7} {len(cipher):>9}"
+                  f" {enc * 1e3:>11.3f} {dec * 1e3:>11.3f} {size / 1024 / dec:>13.1f}")
@@ -0,0 +1,44 @@
+"""Compares the average RSA decryption time over the full modulus, with CRT and with CRT and blinding"""
+import random
+import time
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import RSA.utils
+
+# (label, prime range) - the first one is what RSA.client and RSA.server use
+KEY_SIZES = [("2x100 digits", (10**100, 10**101)),
+             ("1024 bit", (2**511, 2**512 - 1)),
+             ("2048 bit", (2**1023, 2**1024 - 1))]
+ITERATIONS = 200
+
+
+def dec_time_full(key, ciphers):
+    """Returns an average time of pow(c, d, n)"""
+    start_time = time.perf_counter()
+    for c in ciphers:
+        pow(c, key.decrypt_key, key.mod)
+    return (time.perf_counter() - start_time) / len(ciphers)
+
+
+def dec_time_crt(key, ciphers):
+    """Returns an average time of PrivateKey.decrypt"""
+    start_time = time.perf_counter()
+    for c in ciphers:
+        key.decrypt(c)
+    return (time.perf_counter() - start_time) / len(ciphers)
+
+
+if __name__ == "__main__":
+    print(f"{'key':>13} {'full ms':>8} {'CRT ms':>8} {'blinded ms':>11} {'speedup':>8}")
+    for label, (min_value, max_value) in KEY_SIZES:
+        key = RSA.utils.PrivateKey.generate(min_value, max_value)
+        blinded = RSA.utils.PrivateKey(key.p, key.q, key.encrypt_key, blinding=True)
+        ciphers = [pow(random.randrange(key.mod), key.encrypt_key, key.mod) for _ in range(ITERATIONS)]
+        assert all(blinded.decrypt(c) == pow(c, key.decrypt_key, key.mod) for c in ciphers[:10])
+
+        full = dec_time_full(key, ciphers)
+        crt = dec_time_crt(key, ciphers)
+        blind = dec_time_crt(blinded, ciphers)
+        print(f"{label:>13} {full * 1e3:>8.3f} {crt * 1e3:>8.3f} {blind * 1e3:>11.3f} {full / crt:>7.2f}x")
@@ -0,0 +1,65 @@
+"""Compares the time to encrypt one message for many recipients with RSA blocks and with hybrid envelopes"""
+import os
+import time
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, "RSA")) ## RSA.hybrid imports its neighbours as the RSA scripts do
+import utils
+import blocks
+import hybrid
+
+KEY_BITS = 2048
+RECIPIENTS = [1, 10, 100]
+MESSAGE_SIZES = [64, 1024, 16384]
+
+
+def fanout_time_blocks(keys, data):
+    """Returns the time to encrypt data in RSA blocks for every recipient"""
+    start_time = time.perf_counter()
+    for key in keys:
+        blocks.encrypt(data, key.encrypt_key, key.mod)
+    return time.perf_counter() - start_time
+
+
+def fanout_time_hybrid(session, keys, data):
+    """Returns the time to seal data once and wrap the session key for every recipient"""
+    start_time = time.perf_counter()
+    payload = session.seal(data)
+    for key in keys:
+        session.wrap(key.encrypt_key, key.mod) + payload
+    return time.perf_counter() - start_time
+
+
+if __name__ == "__main__":
+    print(f"generating {max(RECIPIENTS)} recipient keys of {KEY_BITS} bits...")
+    keys = [utils.PrivateKey.generate(*utils.prime_range(KEY_BITS, 4), count=4) for _ in range(max(RECIPIENTS))]
+    reader = hybrid.EnvelopeReader(keys[0])
+    assert reader.open(hybrid.SessionKey().encrypt(b"check", keys[0].encrypt_key, keys[0].mod)) == b"check"
+
+    print(f"{'recipients':>10} {'message':>8} {'blocks ms':>10} {'hybrid new ms':>14} {'hybrid cached ms':>17}")
+    for count in RECIPIENTS:
+        for size in MESSAGE_SIZES:
+            data = os.urandom(size)
+            session = hybrid.SessionKey()
+            full = fanout_time_blocks(keys[:count], data)
+            new = fanout_time_hybrid(session, keys[:count], data) # every wrap computed
+            cached = fanout_time_hybrid(session, keys[:count], data) # same session, wraps reused
+            print(f"{count:>10} {size:>8} {full * 1e3:>10.2f} {new * 1e3:>14.2f} {cached * 1e3:>17.3f}")
+
+    ## what the server spends on every incoming message before the fanout
+    print(f"\n{'message':>8} {'blocks decrypt ms':>18} {'envelope open ms':>17}")
+    session = hybrid.SessionKey()
+    for size in MESSAGE_SIZES:
+        data = os.urandom(size)
+        cipher = blocks.encrypt(data, keys[0].encrypt_key, keys[0].mod)
+        envelope = session.encrypt(data, keys[0].encrypt_key, keys[0].mod)
+        reader.open(envelope) # the first message of a session unwraps its key
+        start_time = time.perf_counter()
+        assert blocks.decrypt(cipher, keys[0]) == data
+        full = time.perf_counter() - start_time
+        start_time = time.perf_counter()
+        assert reader.open(envelope) == data
+        opened = time.perf_counter() - start_time
+        print(f"{size:>8} {full * 1e3:>18.2f} {opened * 1e3:>17.3f}")
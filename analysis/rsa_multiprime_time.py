@@ -0,0 +1,44 @@
+"""Compares key generation and CRT decryption time of two-prime and multi-prime RSA keys of equal modulus size"""
+import random
+import time
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import RSA.utils
+
+KEY_SIZES = [1024, 2048, 3072, 4096]
+PRIME_COUNTS = [2, 3, 4]
+KEYGEN_ITERATIONS = 5
+DECRYPT_ITERATIONS = 100
+
+
+def key_gen_time(bits, count, iterations):
+    """Returns an average time to generate a key and the last key"""
+    min_value, max_value = RSA.utils.prime_range(bits, count)
+    start_time = time.perf_counter()
+    for _ in range(iterations):
+        key = RSA.utils.PrivateKey.generate(min_value, max_value, count=count)
+    return (time.perf_counter() - start_time) / iterations, key
+
+
+def dec_time(key, iterations):
+    """Returns an average time of PrivateKey.decrypt"""
+    ciphers = [pow(random.randrange(key.mod), key.encrypt_key, key.mod) for _ in range(iterations)]
+    start_time = time.perf_counter()
+    for c in ciphers:
+        key.decrypt(c)
+    return (time.perf_counter() - start_time) / iterations
+
+
+if __name__ == "__main__":
+    print(f"{'key bits':>8} {'primes':>6} {'keygen ms':>10} {'decrypt ms':>11} {'vs 2 primes':>12}")
+    for bits in KEY_SIZES:
+        baseline = None
+        for count in PRIME_COUNTS:
+            keygen, key = key_gen_time(bits, count, KEYGEN_ITERATIONS)
+            assert key.mod.bit_length() == bits
+            dec = dec_time(key, DECRYPT_ITERATIONS)
+            if baseline is None:
+                baseline = dec
+            print(f"{bits:>8} {count:>6} {keygen * 1e3:>10.1f} {dec * 1e3:>11.3f} {baseline / dec:>11.2f}x")
@@ -0,0 +1,170 @@
+"""Sending and receiving attachments over the relay's transfer sub-protocol.
+
+    sender -> offer (id, name, size, chunk size, stream header)
+    recipient -> accept (offset to start from, window)
+    sender -> chunk frames, never more than `window` chunks past the last ack
+    recipient -> ack (offset) for every chunk, done after the last one
+    either side -> cancel
+
+Every chunk is sealed with ECC.stream under the recipient's key, so the
+relay forwards only ciphertext. The sender maps the file with mmap and
+seals one chunk at a time. The recipient writes into a .part file named
+after the transfer id; the id is derived from the file, so offering the
+same file again finds that file and the transfer continues from its size.
+"""
+import mmap
+import os
+from hashlib import sha256
+from typing import Optional
+
+import envelope
+import ECC.stream
+
+CHUNK_SIZE = ECC.stream.CHUNK_SIZE
+WINDOW = 8 # chunks in flight
+
+
+def chunk_count(size: int, chunk_size: int) -> int:
+    """Chunks of a file, an empty file is one empty chunk"""
+    return max(1, -(-size // chunk_size))
+
+
+def file_id(sender: str, recipient: str, path: str) -> str:
+    """
+    Transfer id that stays the same while the file does not change
+
+    :return: str, 32 hex digits
+    """
+    info = os.stat(path)
+    name = os.path.basename(path)
+    return sha256(f"{sender}|{recipient}|{name}|{info.st_size}|{info.st_mtime_ns}".encode()).hexdigest()[:32]
+
+
+class OutgoingFile:
+    """
+    A file being sent: offer(), then frames() after accept() and every ack()
+    """
+    def __init__(self, path: str, sender: str, recipient: str, key: bytes, chunk_size: int = CHUNK_SIZE):
+        self.path = path
+        self.sender = sender
+        self.recipient = recipient
+        self.transfer_id = file_id(sender, recipient, path)
+        self.chunk_size = chunk_size
+        self._file = open(path, 'rb')
+        self.size = os.fstat(self._file.fileno()).st_size
+        ## an empty file cannot be mapped
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else None
+        self._encryptor = ECC.stream.StreamEncryptor(key, chunk_size)
+        self.chunks = chunk_count(self.size, chunk_size)
+        self.acked = 0 # bytes the recipient has written
+        self.window = 0
+        self._next = None # index of the next chunk to send, None until accepted
+
+    def offer(self) -> str:
+        return envelope.encode_control('offer', self.sender, self.recipient, self.transfer_id,
+                                       name=os.path.basename(self.path), size=self.size,
+                                       chunk=self.chunk_size, header=self._encryptor.header.hex())
+
+    def accept(self, offset: int, window: int):
+        """The recipient has `offset` bytes already (a resumed transfer)."""
+        if offset % self.chunk_size or offset > self.size:
+            raise ValueError('Wrong resume offset')
+        self.acked = offset
+        self.window = window
+        self._next = offset // self.chunk_size
+
+    def ack(self, offset: int):
+        self.acked = max(self.acked, min(offset, self.size))
+
+    def frames(self) -> list[bytes]:
+        """Chunk frames the window allows now"""
+        if self._next is None:
+            return []
+        limit = min(self.acked // self.chunk_size + self.window, self.chunks)
+        frames = []
+        while self._next < limit:
+            frames.append(self._frame(self._next))
+            self._next += 1
+        return frames
+
+    def cancel(self) -> str:
+        return envelope.encode_control('cancel', self.sender, self.recipient, self.transfer_id)
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+        self._file.close()
+
+    def _frame(self, index):
+        start = index * self.chunk_size
+        end = min(start + self.chunk_size, self.size)
+        final = index == self.chunks - 1
+        if self._map is None:
+            sealed = self._encryptor.seal_chunk(index, b'', final)
+        else:
+            with memoryview(self._map)[start:end] as chunk: ## no copy of the file data
+                sealed = self._encryptor.seal_chunk(index, chunk, final)
+        return envelope.encode_chunk(self.sender, self.recipient, self.transfer_id, start, sealed)
+
+
+class IncomingFile:
+    """
+    A file being received into `directory`: accept(), then write() every chunk frame
+    """
+    def __init__(self, offer: dict, key: bytes, directory: str):
+        name = os.path.basename(offer['name'])
+        if name in ('', '.', '..'):
+            raise ValueError('Bad file name')
+        self.sender = offer['from']
+        self.recipient = offer['to']
+        self.transfer_id = offer['id']
+        self.size = offer['size']
+        self._decryptor = ECC.stream.StreamDecryptor(key, bytes.fromhex(offer['header']))
+        self.chunk_size = self._decryptor.chunk_size
+        if self.chunk_size != offer['chunk']:
+            raise ValueError('Chunk size does not match the stream header')
+        self.chunks = chunk_count(self.size, self.chunk_size)
+        self.done = False
+
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, name)
+        self.part = os.path.join(directory, f".{self.transfer_id}.part")
+        self._file = open(self.part, 'ab+')
+        ## only whole chunks count, a torn last write is received again
+        have = min(os.fstat(self._file.fileno()).st_size, self.size)
+        self.received = have - have % self.chunk_size
+        self._file.truncate(self.received)
+
+    def accept(self, window: int = WINDOW) -> str:
+        return envelope.encode_control('accept', self.recipient, self.sender, self.transfer_id,
+                                       offset=self.received, window=window)
+
+    def write(self, offset: int, sealed: bytes) -> Optional[str]:
+        """
+        Stores a chunk, raises ValueError if it fails authentication
+
+        :return: str, the ack or done message to send back, None for a chunk already written
+        """
+        if offset != self.received:
+            return None
+        index = offset // self.chunk_size
+        final = index == self.chunks - 1
+        data = self._decryptor.open_chunk(index, sealed, final)
+        if len(data) != min(self.chunk_size, self.size - offset):
+            raise ValueError(f'Chunk {index} has a wrong size')
+        self._file.write(data) ## 'a' mode: always at the end, which is offset
+        self.received += len(data)
+        if not final:
+            return envelope.encode_control('ack', self.recipient, self.sender, self.transfer_id,
+                                           offset=self.received)
+        self._file.close()
+        os.replace(self.part, self.path)
+        self.done = True
+        return envelope.encode_control('done', self.recipient, self.sender, self.transfer_id)
+
+    def cancel(self) -> str:
+        return envelope.encode_control('cancel', self.recipient, self.sender, self.transfer_id)
+
+    def close(self):
+        """Stop receiving, the .part file stays for a resume"""
+        self._file.close()
@@ -1,20 +1,26 @@
 """Client for the secure messenger using PyQt6 and asyncio."""
+import os
 import sys
 import asyncio
 import threading
 import websockets
+import urllib.parse
 import urllib.request
+from collections import OrderedDict
 from PyQt6.QtWidgets import (
     QApplication, QWidget, QVBoxLayout, QHBoxLayout, QPushButton,
-    QListWidget, QTextEdit, QLineEdit, QLabel, QMessageBox
+    QListWidget, QTextEdit, QLineEdit, QLabel, QMessageBox, QFileDialog
 )
 from PyQt6.QtCore import Qt, pyqtSignal, QObject
 
-from DSA.sign_utils import generate_keys, sign_message
-from DSA.verification import verify_sign
-import base64, ast, json
+from DSA.sign_utils import generate_keys, sign_message, SigningPool
+from DSA.verification import SenderCache, verify_sign
+import ast, json
 
 from ECC.client import ECC
+from ECC.key_pool import KeyPool
+from attachment import IncomingFile, OutgoingFile
+import envelope
 
 
 with open("DSA_params.txt", "r", encoding="utf-8") as f:
@@ -24,17 +30,80 @@ q = int(lines[1].split(": ")[1])
 g = int(lines[2].split(": ")[1])
 
 SERVER_URL = "wss://helo-bw8r.onrender.com/ws/"
+KEYS_URL = "https://helo-bw8r.onrender.com/keys"
+KEY_BATCH = 32 # usernames per key directory request
+# MESSENGER_KEY_POOL=<file> keeps spare ECC key pairs between runs
+key_pool = KeyPool(path=os.environ.get("MESSENGER_KEY_POOL"))
+DOWNLOADS = os.environ.get("MESSENGER_DOWNLOADS", "downloads") # received files
 
 class SignalHandler(QObject):
     """Signal handler for PyQt signals."""
     new_message = pyqtSignal(str)
     update_users = pyqtSignal(list)
+    file_offer = pyqtSignal(dict)
+
+class KeyCache:
+    """LRU cache of other users' public keys, filled from the key directory.
+
+    Every invalidation bumps the user's generation. A fetch passes the
+    generation it started at to put(), so keys fetched before a
+    reconnect cannot be cached over the invalidation.
+    """
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self._keys = OrderedDict()
+        self._epoch = 0 # bumped when everyone is invalidated
+        self._generations = {}
+        self._lock = threading.Lock() # filled from fetch threads, read from the UI
+
+    def get(self, username):
+        """Return (public_key, y) of a user, or None if it is not cached."""
+        with self._lock:
+            keys = self._keys.get(username)
+            if keys is not None:
+                self._keys.move_to_end(username)
+            return keys
+
+    def generation(self, username):
+        """Current generation of a user's entry, to pass to put()."""
+        with self._lock:
+            return self._epoch, self._generations.get(username, 0)
+
+    def put(self, username, public_key, y, generation=None):
+        """Remember the keys of a user. Returns False if the user was invalidated since `generation`."""
+        with self._lock:
+            if generation is not None and generation != (self._epoch, self._generations.get(username, 0)):
+                return False
+            self._keys[username] = (public_key, y)
+            self._keys.move_to_end(username)
+            while len(self._keys) > self.maxsize:
+                self._keys.popitem(last=False)
+            return True
+
+    def invalidate(self, username=None):
+        """Forget one user (they left or reconnected with new keys), or everyone."""
+        with self._lock:
+            if username is None:
+                self._keys.clear()
+                self._generations.clear()
+                self._epoch += 1
+            else:
+                self._keys.pop(username, None)
+                self._generations[username] = self._generations.get(username, 0) + 1
+
+    def __contains__(self, username):
+        with self._lock:
+            return username in self._keys
 
 class ChatClient(QWidget):
     """Main window for the secure messenger client."""
     def __init__(self):
         super().__init__()
-        self.private_key, self.public_key = ECC.create_keys()
+        self.private_key, self.public_key = None, None # taken from key_pool when connecting
+        key_pool.start()
+        self.sign_key, self.verify_key = generate_keys(p, q, g) # DSA identity for the whole session
+        self.signing_pool = SigningPool(p, q, g).start()
+        self.sender_contexts = SenderCache(p, q, g)
 
         self._connected = False
 
@@ -46,10 +115,17 @@ class ChatClient(QWidget):
         self.loop = None
         self.selected_recipient = None
         self.selected_recipient_key = None
+        self.online_users = set()
+        self.users_lock = threading.Lock() # online_users changes in the asyncio thread, read in the UI one
+        self.key_cache = KeyCache()
+        self.users_version = None # presence version the user list is at
+        self.outgoing = {} # transfer id -> OutgoingFile, used in the asyncio thread only
+        self.incoming = {} # transfer id -> IncomingFile, likewise
 
         self.signals = SignalHandler()
         self.signals.new_message.connect(self.add_chat_message)
         self.signals.update_users.connect(self.update_users_list)
+        self.signals.file_offer.connect(self.file_offered)
 
         self.build_ui()
 
@@ -85,8 +161,11 @@ class ChatClient(QWidget):
         self.message_input.setPlaceholderText("Напишіть повідомлення")
         self.send_button = QPushButton("✉️ Надіслати")
         self.send_button.clicked.connect(self.send_message)
+        self.file_button = QPushButton("📎 Файл")
+        self.file_button.clicked.connect(self.send_file)
         bottom_layout.addWidget(self.message_input)
         bottom_layout.addWidget(self.send_button)
+        bottom_layout.addWidget(self.file_button)
         layout.addLayout(bottom_layout)
 
         self.setLayout(layout)
@@ -122,32 +201,72 @@ class ChatClient(QWidget):
             if user != self.username:
                 self.users_list.addItem(user)
 
-    async def __fetch_public_key(self, username):
+    def __fetch_public_keys(self, usernames):
+        """Resolve the keys of several users with one key directory request."""
+        generations = {username: self.key_cache.generation(username) for username in usernames}
+        query = urllib.parse.urlencode({"users": ",".join(usernames)})
         try:
-            async with websockets.connect(SERVER_URL + f'get_key_{username}') as websocket:
-                public_key = await websocket.recv() ## gettin key from server
-                print(public_key)
-                self.selected_recipient_key = ast.literal_eval(public_key)
+            with urllib.request.urlopen(f"{KEYS_URL}?{query}", timeout=10) as response:
+                keys = json.loads(response.read()) ## gettin keys from server
         except Exception as e:
-            print(f"❌ Помилка отримання ключа користувача {username}: {e}")
+            print(f"❌ Помилка отримання ключів користувачів {usernames}: {e}")
+            return
+        for username, entry in keys.items():
+            if username in generations: ## stale if the user reconnected while we were waiting
+                self.key_cache.put(username, ast.literal_eval(entry["public_key"]), entry["y"],
+                                   generations[username])
+
+    def __load_recipient_key(self, recipient, usernames):
+        self.__fetch_public_keys(usernames)
+        keys = self.key_cache.get(recipient)
+        if keys is not None and self.selected_recipient == recipient:
+            self.selected_recipient_key = keys[0]
+
+    def __forget_keys(self, username=None):
+        """Drop cached keys and verification tables of a user, or of everyone."""
+        self.key_cache.invalidate(username)
+        self.sender_contexts.forget(username)
+
+    async def __sender_keys(self, username, y):
+        """Keys a sender published in the key directory, refetched once if y in the message differs."""
+        keys = self.key_cache.get(username)
+        if keys is None or keys[1] != y:
+            self.__forget_keys(username)
+            await asyncio.to_thread(self.__fetch_public_keys, [username])
+            keys = self.key_cache.get(username)
+        return keys
 
     def user_selected(self, item):
         """Handle user selection from the list."""
         self.selected_recipient = item.text()
         self.message_input.setPlaceholderText(f"Пишете до: {self.selected_recipient}")
-        threading.Thread(target=lambda: asyncio.run(self.__fetch_public_key(self.selected_recipient)),
+
+        keys = self.key_cache.get(self.selected_recipient)
+        if keys is not None:
+            self.selected_recipient_key = keys[0]
+            return
+
+        ## one request also warms the cache for other users we are likely to open
+        self.selected_recipient_key = None
+        with self.users_lock:
+            online_users = list(self.online_users)
+        others = [user for user in online_users
+                  if user not in (self.username, self.selected_recipient) and user not in self.key_cache]
+        batch = [self.selected_recipient] + others[:KEY_BATCH - 1]
+        threading.Thread(target=self.__load_recipient_key, args=(self.selected_recipient, batch),
                          daemon=True).start()
 
     def run_client(self):
         """Run the asyncio event loop in a separate thread."""
         asyncio.set_event_loop(self.loop)
+        self.private_key, self.public_key = key_pool.take() # off the UI thread
         self.loop.run_until_complete(self.connect_to_server())
 
     async def listen_messages(self):
         """Listen for incoming messages from the server."""
         async for content in self.websocket:
 
-            if content.startswith("__ERROR__:Username already taken"):
+            if isinstance(content, str) and content.startswith("__ERROR__:Username already taken"):
                 self.signals.new_message.emit("❌ Ім’я вже зайняте. Виберіть інше.")
                 await self.websocket.close()
                 return
@@ -157,25 +276,189 @@ class ChatClient(QWidget):
                     self._connected = True
 
             if isinstance(content, str) and content.startswith("__USERS__:"):
-                users_str = content.replace("__USERS__:", "")
-                users = users_str.split(",") if users_str else []
+                version, users_str = content.replace("__USERS__:", "", 1).split(":", 1)
+                self.users_version = int(version)
+                with self.users_lock:
+                    self.online_users = set(users_str.split(",")) if users_str else set()
+                    users = sorted(self.online_users)
+                self.__forget_keys() ## we may have missed reconnects
                 self.signals.update_users.emit(users)
+                continue
+
+            if isinstance(content, str) and content.startswith("__PRESENCE__:"):
+                if self.users_version is None: # the full list is still on its way
+                    continue
+                old_version, new_version, changes = content.replace("__PRESENCE__:", "", 1).split(":", 2)
+                if int(old_version) != self.users_version:
+                    await self.websocket.send("__SYNC__") ## missed an update, ask for the full list
+                    continue
+                with self.users_lock:
+                    for change in changes.split(","):
+                        self.__forget_keys(change[1:]) ## joined with new keys or left
+                        if change.startswith("+"):
+                            self.online_users.add(change[1:])
+                        else:
+                            self.online_users.discard(change[1:])
+                    users = sorted(self.online_users)
+                self.users_version = int(new_version)
+                self.signals.update_users.emit(users)
+                continue
+
+            if isinstance(content, bytes) and content[:1] == bytes([envelope.CHUNK_VERSION]):
+                await self.__receive_chunk(content)
+                continue
+            if isinstance(content, str) and content.startswith("{"):
+                await self.__transfer_message(content)
+                continue
 
             try:
-                username, _, message, iv, signature, y = json.loads(content) ## unpackin required variables
-                message, iv = ast.literal_eval(message), base64.b64decode(ast.literal_eval(iv)) ## unpacking bytes from str
-                r, s = signature
+                if isinstance(content, bytes):
+                    fields = envelope.decode_message(content)
+                else:
+                    fields = envelope.decode_json(content) ## older clients
+            except envelope.EnvelopeError:
+                continue ## server status lines
+
+            username, _, message, iv, signature, y = fields ## unpackin required variables
+            try:
                 decrypted_msg = ECC.decrypt(self.private_key, message, iv).strip() # decryption
-                signature = (int(r), int(s))
-                y = int(y)
+            except ValueError: ## queued while we were offline, for the key of an earlier session
+                self.signals.new_message.emit(f"❌ Не вдалося розшифрувати повідомлення від {username}.")
+                continue
+            keys = await self.__sender_keys(username, y)
+            if keys is not None and keys[1] is not None and keys[1] != y:
+                ## the key in the message is not the one the sender published
+                self.signals.new_message.emit(f"❌ Невідомий ключ підпису від {username}!")
+                continue
+            if keys is None or keys[1] is None:
+                ## an old client signing every message with a new key, or a queued
+                ## message from someone who is offline now: only the key in the message is there
                 v = verify_sign(decrypted_msg, signature, p, q, g, y)
-                if not v:
-                    self.signals.new_message.emit("❌ Некоректний підпис!")
-                    continue
-                self.signals.new_message.emit(f"📩 {username}: {decrypted_msg}")
-
-            except json.JSONDecodeError:
+                prefix = "⚠️ (ключ підпису не перевірено) "
+            else:
+                try:
+                    context = self.sender_contexts.get(username, keys[1])
+                except ValueError: ## the directory has a newer key than our tables
+                    self.sender_contexts.forget(username)
+                    context = self.sender_contexts.get(username, keys[1])
+                v = context.verify(decrypted_msg, signature)
+                prefix = ""
+            if not v:
+                self.signals.new_message.emit("❌ Некоректний підпис!")
                 continue
+            self.signals.new_message.emit(f"📩 {prefix}{username}: {decrypted_msg}")
+
+    async def __transfer_message(self, content):
+        """Handle offer/accept/ack/done/cancel of a file transfer."""
+        try:
+            control = envelope.decode_control(json.loads(content))
+        except (ValueError, AttributeError):
+            return
+        if control["to"] != self.username:
+            return
+        kind, transfer_id = control["transfer"], control["id"]
+        if kind == "offer":
+            self.signals.file_offer.emit(control) ## the user decides in the UI thread
+            return
+
+        outgoing = self.outgoing.get(transfer_id)
+        if outgoing is not None and outgoing.recipient == control["from"]:
+            if kind == "accept":
+                try:
+                    outgoing.accept(control["offset"], control["window"])
+                except ValueError:
+                    kind = "cancel"
+                    await self.websocket.send(outgoing.cancel())
+            elif kind == "ack":
+                outgoing.ack(control["offset"])
+            if kind in ("done", "cancel"):
+                del self.outgoing[transfer_id]
+                outgoing.close()
+                status = "доставлено" if kind == "done" else "скасовано"
+                self.signals.new_message.emit(f"📎 Файл {os.path.basename(outgoing.path)} {status}.")
+                return
+            for frame in outgoing.frames():
+                await self.websocket.send(frame)
+            return
+
+        incoming = self.incoming.get(transfer_id)
+        if kind == "cancel" and incoming is not None and incoming.sender == control["from"]:
+            del self.incoming[transfer_id]
+            incoming.close()
+            self.signals.new_message.emit(f"📎 {incoming.sender} скасував передачу файлу.")
+
+    async def __receive_chunk(self, content):
+        """Write a chunk of an accepted file and acknowledge it."""
+        try:
+            sender, _, transfer_id, offset, data = envelope.decode_chunk(content)
+        except envelope.EnvelopeError:
+            return
+        incoming = self.incoming.get(transfer_id)
+        if incoming is None or incoming.sender != sender:
+            return
+        try:
+            reply = incoming.write(offset, data)
+        except ValueError: ## tampered with, or sealed for an earlier key of ours
+            del self.incoming[transfer_id]
+            incoming.close()
+            await self.websocket.send(incoming.cancel())
+            self.signals.new_message.emit(f"❌ Файл від {sender} пошкоджено, передачу скасовано.")
+            return
+        if reply is None:
+            return
+        await self.websocket.send(reply)
+        if incoming.done:
+            del self.incoming[transfer_id]
+            self.signals.new_message.emit(f"📎 Отримано файл від {sender}: {incoming.path}")
+
+    async def __accept_file(self, offer):
+        try:
+            incoming = IncomingFile(offer, self.private_key, DOWNLOADS)
+        except (OSError, ValueError) as e:
+            self.signals.new_message.emit(f"❌ Не вдалося прийняти файл: {e}")
+            await self.websocket.send(envelope.encode_control("cancel", self.username, offer["from"], offer["id"]))
+            return
+        old = self.incoming.pop(incoming.transfer_id, None) ## offered again to resume
+        if old is not None:
+            old.close()
+        self.incoming[incoming.transfer_id] = incoming
+        await self.websocket.send(incoming.accept())
+
+    async def __start_upload(self, outgoing):
+        old = self.outgoing.pop(outgoing.transfer_id, None) ## the same file again: a resume
+        if old is not None:
+            old.close()
+        self.outgoing[outgoing.transfer_id] = outgoing
+        await self.websocket.send(outgoing.offer())
+
+    def file_offered(self, offer):
+        """Ask the user whether to receive an offered file."""
+        answer = QMessageBox.question(self, "Файл",
+                                      f"{offer['from']} надсилає {offer['name']} ({offer['size']} байт). Прийняти?")
+        if answer == QMessageBox.StandardButton.Yes:
+            asyncio.run_coroutine_threadsafe(self.__accept_file(offer), self.loop)
+        else:
+            cancel = envelope.encode_control("cancel", self.username, offer["from"], offer["id"])
+            asyncio.run_coroutine_threadsafe(self.websocket.send(cancel), self.loop)
+
+    def send_file(self):
+        """Offer a file to the selected recipient."""
+        if not self.websocket:
+            QMessageBox.warning(self, "Помилка", "Ви ще не підключені!")
+            return
+        if not self.selected_recipient or self.selected_recipient_key is None:
+            QMessageBox.warning(self, "Помилка", "Спершу оберіть одержувача!")
+            return
+        path, _ = QFileDialog.getOpenFileName(self, "Файл")
+        if not path:
+            return
+        try:
+            outgoing = OutgoingFile(path, self.username, self.selected_recipient, self.selected_recipient_key)
+        except OSError as e:
+            QMessageBox.warning(self, "Помилка", f"Не вдалося відкрити файл: {e}")
+            return
+        asyncio.run_coroutine_threadsafe(self.__start_upload(outgoing), self.loop)
+        self.add_chat_message(f"📎 Ви до {self.selected_recipient}: {os.path.basename(path)}")
 
     async def connect_to_server(self):
         """Connect to the WebSocket server."""
@@ -183,7 +466,8 @@ class ChatClient(QWidget):
         try:
             async with websockets.connect(uri) as websocket:
                 self.websocket = websocket
-                await websocket.send(str(self.public_key))
+                await websocket.send(json.dumps({"public_key": str(self.public_key),
+                                                 "y": self.verify_key})) # published once per session
                 await self.listen_messages()
         except Exception as e:
             print(e)
@@ -197,22 +481,28 @@ class ChatClient(QWidget):
         if not self.selected_recipient:
             QMessageBox.warning(self, "Помилка", "Спершу оберіть одержувача!")
             return
+        if self.selected_recipient_key is None:
+            QMessageBox.warning(self, "Помилка", "Ключ одержувача ще не отримано.")
+            return
         message_text = self.message_input.text().strip()
         encrypted_msg, iv = ECC.encrypt(self.selected_recipient_key, message_text.encode('utf-8')) # encryption
-        iv = base64.b64encode(iv)
-        x, y = generate_keys(p, q, g)
-        signature = sign_message(message_text, p, q, g, x)
+        signature = sign_message(message_text, p, q, g, self.sign_key, pool=self.signing_pool)
         if not message_text:
             QMessageBox.warning(self, "Помилка", "Повідомлення порожнє.")
             return
 
-        to_send = json.dumps((self.username, self.selected_recipient, str(encrypted_msg), str(iv), signature, y))
+        ## old clients publish no DSA key and cannot read binary frames, JSON works for everyone
+        keys = self.key_cache.get(self.selected_recipient)
+        binary = keys is not None and keys[1] is not None
+        encode = envelope.encode_message if binary else envelope.encode_json
+        to_send = encode(self.username, self.selected_recipient, encrypted_msg, iv, signature, self.verify_key)
         asyncio.run_coroutine_threadsafe(self.websocket.send(to_send), self.loop)
         self.add_chat_message(f"➡️ Ви до {self.selected_recipient}: {message_text}")
         self.message_input.clear()
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
+    app.aboutToQuit.connect(key_pool.stop)
     window = ChatClient()
     window.show()
     sys.exit(app.exec())
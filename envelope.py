@@ -0,0 +1,252 @@
+"""Binary message envelope shared by the client and the relay server.
+
+A frame starts with a small routing header:
+
+    version: 1 byte
+    sender length: 1 byte, sender: utf-8
+    recipient length: 1 byte, recipient: utf-8
+
+and everything after it is the body, which the relay never looks into.
+It forwards the received frame as the same bytes. The chat message body is
+
+    iv: 1 byte length + bytes
+    ciphertext: 4 byte length + bytes
+    signature r, s and the signer key y: 2 byte length + big-endian integer each
+
+Old clients send the same six fields as a JSON list with str(bytes) values,
+decode_json/encode_json handle that format.
+
+Attachments travel as chunk frames: the routing header with version
+CHUNK_VERSION, then
+
+    transfer id: 16 bytes
+    offset of the chunk in the file: 8 bytes
+    data: the sealed chunk, at most the offered chunk size + CHUNK_OVERHEAD
+
+A transfer is set up and paced by JSON objects in text frames (chat
+messages are JSON lists): {"transfer": kind, "id": hex id, "from", "to", ...}
+with the kinds and extra fields in TRANSFER_FIELDS.
+"""
+import ast
+import base64
+import json
+import struct
+
+ENVELOPE_VERSION = 1
+CHUNK_VERSION = 2
+CHUNK_OVERHEAD = 16 # the AES-GCM tag of every sealed chunk
+MAX_CHUNK_SIZE = 1024 * 1024
+MAX_NAME = 255 # utf-8 bytes of a username, its length is one byte of the header
+
+TRANSFER_FIELDS = {
+    'offer': ('name', 'size', 'chunk', 'header'), # header: the ECC.stream header, hex
+    'accept': ('offset', 'window'), # window: chunks the sender may send past the acknowledged offset
+    'ack': ('offset',),
+    'done': (),
+    'cancel': (),
+}
+
+
+class EnvelopeError(ValueError):
+    """Raised for frames that are not a valid envelope."""
+
+
+def check_name(name) -> str:
+    """
+    Checks that a username from a peer fits the routing header
+
+    :param name: any parsed JSON value
+    :return: str, the same name
+    """
+    if not isinstance(name, str):
+        raise EnvelopeError('Broken username')
+    if len(name.encode()) > MAX_NAME:
+        raise EnvelopeError('Username is too long')
+    return name
+
+
+def encode_header(sender: str, recipient: str) -> bytes:
+    """
+    Builds the routing header
+
+    :param sender: str
+    :param recipient: str
+    :return: bytes
+    """
+    sender_raw, recipient_raw = check_name(sender).encode(), check_name(recipient).encode()
+    return bytes([ENVELOPE_VERSION, len(sender_raw)]) + sender_raw \
+        + bytes([len(recipient_raw)]) + recipient_raw
+
+
+def read_route(frame: bytes) -> tuple[str, str, int]:
+    """
+    Reads only the routing header of a frame
+
+    :param frame: bytes
+    :return: tuple[str, str, int], sender, recipient and the offset of the body
+    """
+    try:
+        if frame[0] not in (ENVELOPE_VERSION, CHUNK_VERSION):
+            raise EnvelopeError(f'Unknown envelope version {frame[0]}')
+        end = 2 + frame[1]
+        sender = frame[2:end].decode()
+        start, end = end + 1, end + 1 + frame[end]
+        recipient = frame[start:end].decode()
+    except (IndexError, UnicodeDecodeError) as e:
+        raise EnvelopeError('Broken routing header') from e
+    if end > len(frame):
+        raise EnvelopeError('Broken routing header')
+    return sender, recipient, end
+
+
+def _int_field(value: int) -> bytes:
+    raw = value.to_bytes((value.bit_length() + 7) // 8 or 1)
+    return struct.pack('>H', len(raw)) + raw
+
+
+def encode_message(sender: str, recipient: str, ciphertext: bytes, iv: bytes,
+                   signature: tuple[int, int], y: int) -> bytes:
+    """
+    Packs a chat message into a binary frame
+
+    :param sender: str
+    :param recipient: str
+    :param ciphertext: bytes
+    :param iv: bytes, AES IV
+    :param signature: tuple[int, int], DSA (r, s)
+    :param y: int, the signer's DSA public key
+    :return: bytes
+    """
+    r, s = signature
+    return b''.join((encode_header(sender, recipient),
+                     bytes([len(iv)]), iv,
+                     struct.pack('>I', len(ciphertext)), ciphertext,
+                     _int_field(r), _int_field(s), _int_field(y)))
+
+
+def decode_message(frame: bytes) -> tuple[str, str, bytes, bytes, tuple[int, int], int]:
+    """
+    Unpacks a binary frame
+
+    :param frame: bytes
+    :return: tuple, (sender, recipient, ciphertext, iv, (r, s), y) - the order of the JSON format
+    """
+    sender, recipient, pos = read_route(frame)
+    if frame[0] != ENVELOPE_VERSION:
+        raise EnvelopeError('Not a chat message')
+    try:
+        iv_end = pos + 1 + frame[pos]
+        iv = frame[pos + 1:iv_end]
+        (length,) = struct.unpack_from('>I', frame, iv_end)
+        pos = iv_end + 4
+        ciphertext = frame[pos:pos + length]
+        pos += length
+
+        numbers = []
+        for _ in range(3):
+            (length,) = struct.unpack_from('>H', frame, pos)
+            pos += 2
+            numbers.append(int.from_bytes(frame[pos:pos + length]))
+            pos += length
+    except (IndexError, struct.error) as e:
+        raise EnvelopeError('Broken message body') from e
+    if pos != len(frame):
+        raise EnvelopeError('Broken message body')
+
+    r, s, y = numbers
+    return sender, recipient, ciphertext, iv, (r, s), y
+
+
+def encode_chunk(sender: str, recipient: str, transfer_id: str, offset: int, data: bytes) -> bytes:
+    """
+    Packs one attachment chunk into a binary frame
+
+    :param transfer_id: str, 32 hex digits
+    :param offset: int, where the chunk starts in the file
+    :param data: bytes, the sealed chunk
+    :return: bytes
+    """
+    header = encode_header(sender, recipient)
+    return b''.join((bytes([CHUNK_VERSION]), header[1:], bytes.fromhex(transfer_id),
+                     struct.pack('>Q', offset), data))
+
+
+def decode_chunk(frame: bytes) -> tuple[str, str, str, int, memoryview]:
+    """
+    Unpacks a chunk frame without copying the data
+
+    :param frame: bytes
+    :return: tuple, (sender, recipient, transfer id, offset, data)
+    """
+    sender, recipient, pos = read_route(frame)
+    if frame[0] != CHUNK_VERSION or len(frame) < pos + 24:
+        raise EnvelopeError('Not an attachment chunk')
+    (offset,) = struct.unpack_from('>Q', frame, pos + 16)
+    return sender, recipient, frame[pos:pos + 16].hex(), offset, memoryview(frame)[pos + 24:]
+
+
+def encode_control(kind: str, sender: str, recipient: str, transfer_id: str, **fields) -> str:
+    """
+    Packs a transfer control message
+
+    :param kind: str, one of TRANSFER_FIELDS
+    :return: str
+    """
+    return json.dumps({'transfer': kind, 'id': transfer_id, 'from': sender, 'to': recipient, **fields})
+
+
+def decode_control(data: dict) -> dict:
+    """
+    Checks a parsed transfer control message
+
+    :param data: dict, the JSON object of the frame
+    :return: dict, the same message
+    """
+    kind = data.get('transfer')
+    fields = TRANSFER_FIELDS.get(kind) if isinstance(kind, str) else None
+    if fields is None:
+        raise EnvelopeError('Unknown transfer message')
+    try:
+        if len(bytes.fromhex(data['id'])) != 16:
+            raise EnvelopeError('Broken transfer id')
+        check_name(data['from'])
+        check_name(data['to'])
+        values = [data[field] for field in fields]
+    except (KeyError, TypeError, ValueError) as e:
+        raise EnvelopeError('Broken transfer message') from e
+    for field, value in zip(fields, values):
+        if field in ('name', 'header'):
+            if not isinstance(value, str):
+                raise EnvelopeError(f'Broken transfer field {field}')
+        elif not isinstance(value, int) or isinstance(value, bool) or value < 0:
+            raise EnvelopeError(f'Broken transfer field {field}')
+    if 'chunk' in fields and not 0 < data['chunk'] <= MAX_CHUNK_SIZE:
+        raise EnvelopeError('Unsupported chunk size')
+    return data
+
+
+def encode_json(sender: str, recipient: str, ciphertext: bytes, iv: bytes,
+                signature: tuple[int, int], y: int) -> str:
+    """
+    Packs a chat message in the old JSON format, for clients without binary frames
+
+    :return: str
+    """
+    return json.dumps((sender, recipient, str(ciphertext), str(base64.b64encode(iv)), signature, y))
+
+
+def decode_json(text: str) -> tuple[str, str, bytes, bytes, tuple[int, int], int]:
+    """
+    Unpacks a chat message in the old JSON format
+
+    :param text: str
+    :return: tuple, same as decode_message
+    """
+    try:
+        sender, recipient, ciphertext, iv, (r, s), y = json.loads(text)
+        ciphertext = ast.literal_eval(ciphertext) ## unpacking bytes from str
+        iv = base64.b64decode(ast.literal_eval(iv))
+        r, s, y = int(r), int(s), int(y)
+    except (ValueError, TypeError, SyntaxError) as e:
+        raise EnvelopeError('Broken JSON message') from e
+    return sender, recipient, ciphertext, iv, (r, s), y
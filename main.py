@@ -1,13 +1,26 @@
 """Server for WebSocket chat application using FastAPI."""
+import os
 import json
-from typing import Dict
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
-from fastapi.responses import PlainTextResponse
+import time
+import asyncio
+from contextlib import asynccontextmanager
+from hashlib import sha256
+from typing import Optional
+from fastapi import FastAPI, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, PlainTextResponse
+
+from envelope import CHUNK_VERSION, EnvelopeError, check_name, decode_chunk, decode_control, read_route
+from relay import metrics
+from relay.offline import OfflineStore, open_store
+from relay.outbox import OUTBOX_SIZE, SPILL, stats as outbox_stats
+from relay.presence import Presence
+from relay.routing import BrokerBackend, LocalBackend
+from relay.transfer import TRANSFER_STALL, TRANSFER_WINDOW, Transfers
 
 # from DSA.sign_utils import generate_params
 
-app = FastAPI()
-connected_users: Dict[str, tuple[WebSocket, str]] = {}
+MAX_KEY_BATCH = 256 # usernames per /keys request
+OFFLINE_BATCH = 256 # queued frames sent per round when a user comes online
 
 # p, q, g = generate_params()
 
@@ -16,52 +29,291 @@ connected_users: Dict[str, tuple[WebSocket, str]] = {}
 #     f.write(f"q: {q}\n")
 #     f.write(f"g: {g}\n")
 
-async def broadcast_users():
-    """Broadcast the list of connected users to all clients."""
-    user_list = list(connected_users.keys())
-    for user_ws, public_key in connected_users.values():
-        await user_ws.send_text(f"__USERS__:{','.join(user_list)}")
+legacy_clients: set[str] = set() # sent the old plain-text handshake, expect __USERS__:a,b
+
+async def broadcast(text: str):
+    """Queue a text frame for all clients of this worker, their writer tasks send it.
+    Old clients get the full list in their format instead of the delta.
+    """
+    start = time.perf_counter()
+    legacy_text = presence.legacy_snapshot()
+    for username in backend.local_users():
+        backend.send_local(username, legacy_text if username in legacy_clients else text)
+    metrics.presence_seconds.observe(time.perf_counter() - start)
+
+presence = Presence(broadcast)
+# CHAT_OUTBOX_SIZE frames may wait for a slow client, then CHAT_OVERFLOW applies:
+# spill (to the offline queue), drop-oldest or disconnect
+outbox_options = {"outbox_size": int(os.environ.get("CHAT_OUTBOX_SIZE", OUTBOX_SIZE)),
+                  "overflow": os.environ.get("CHAT_OVERFLOW", SPILL)}
+# CHAT_BROKER=<unix socket of relay.broker> lets several workers share users
+if os.environ.get("CHAT_BROKER"):
+    backend = BrokerBackend(presence, os.environ["CHAT_BROKER"], **outbox_options)
+else:
+    backend = LocalBackend(presence, **outbox_options)
+
+transfers = Transfers() # attachment offers made through this worker
+offline: Optional[OfflineStore] = None # frames for users who are not connected, opened on startup
+draining: set[str] = set() # users whose queued frames are being sent right now
+background_tasks: set[asyncio.Task] = set()
+
+async def drain_offline(username: str):
+    """Send the queued frames of a user in batches, each batch is dropped once written to the socket."""
+    try:
+        while True:
+            batch = offline.peek(username, OFFLINE_BATCH)
+            sent = None
+            for seq, frame in batch:
+                try:
+                    if not await backend.deliver(username, frame):
+                        break
+                except Exception: # disconnected again, the rest waits for the next time
+                    break
+                sent = seq
+            await backend.flushed(username)
+            if sent is not None:
+                offline.ack(username, sent)
+            if not batch or sent != batch[-1][0]:
+                return
+    finally:
+        draining.discard(username)
+
+def schedule_drain(username: str):
+    """Start sending queued frames to a user who came online on any worker."""
+    if offline is None or not offline.pending(username) or username in draining:
+        return
+    draining.add(username)
+    task = asyncio.create_task(drain_offline(username))
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+backend.on_join = schedule_drain
+backend.spill = lambda username, frame: offline is not None and offline.append(username, frame)
+backend.on_drained = schedule_drain
+
+async def relay_to(recipient: str, frame) -> str:
+    """Deliver a frame now, or queue it if the recipient is offline. Returns the status line for the sender."""
+    if recipient in draining: # stays behind the queued frames
+        if offline.append(recipient, frame):
+            metrics.messages_relayed.inc()
+            return f"✅ Повідомлення надіслано {recipient}"
+    elif await backend.deliver(recipient, frame):
+        metrics.messages_relayed.inc()
+        return f"✅ Повідомлення надіслано {recipient}"
+    elif offline is not None and offline.append(recipient, frame):
+        metrics.messages_queued.inc()
+        return f"📥 {recipient} не в мережі, повідомлення буде доставлено пізніше."
+    metrics.routing_misses.inc()
+    return f"❌ Користувача {recipient} не знайдено."
+
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    global offline
+    # every worker takes its own slot under CHAT_OFFLINE_DIR
+    offline = open_store(os.environ.get("CHAT_OFFLINE_DIR", "offline_queue"))
+    await backend.start()
+    lag_probe = asyncio.create_task(metrics.probe_loop_lag())
+    yield
+    lag_probe.cancel()
+    await backend.stop()
+    offline.close()
+
+app = FastAPI(lifespan=lifespan)
 
 @app.websocket("/ws/get_key_{username}")
 async def websocket_get_key(websocket: WebSocket, username: str):
     await websocket.accept()
-    await websocket.send_text(str(connected_users[username][1]))
+    await websocket.send_text(str(backend.keys(username)[0]))
     await websocket.close()
 
+def key_version(public_key: str, sign_key: Optional[int]) -> str:
+    """Short tag that changes whenever a user reconnects with new keys."""
+    return sha256(f"{public_key}|{sign_key}".encode()).hexdigest()[:16]
+
+@app.get("/keys")
+async def get_keys(users: str, request: Request):
+    """Key directory: ECC public keys and DSA keys y of many users in one request.
+    Offline users are left out. Supports If-None-Match with the returned ETag.
+    """
+    keys = {}
+    for name in users.split(",")[:MAX_KEY_BATCH]:
+        if backend.is_online(name):
+            public_key, sign_key = backend.keys(name)
+            keys[name] = {"public_key": public_key, "y": sign_key,
+                          "version": key_version(public_key, sign_key)}
+
+    etag = '"' + sha256(json.dumps(keys, sort_keys=True).encode()).hexdigest()[:32] + '"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    return JSONResponse(keys, headers={"ETag": etag})
+
+metrics.registry.gauge("chat_connections", "Open client connections of this worker.",
+                       lambda: len(backend.connections))
+metrics.registry.gauge("chat_users_online", "Users online on all workers.", lambda: len(backend.directory))
+metrics.registry.gauge("chat_offline_frames", "Frames waiting in this worker's offline queue.",
+                       lambda: len(offline) if offline is not None else 0)
+metrics.registry.gauge("chat_transfers", "Attachment transfers this worker is relaying.", lambda: len(transfers))
+metrics.registry.gauge("chat_outbox_frames", "Frames waiting in the outboxes of this worker.",
+                       lambda: outbox_stats.queued)
+metrics.registry.gauge("chat_outbox_peak_depth", "The deepest any outbox has been.", lambda: outbox_stats.peak_depth)
+metrics.registry.counter("chat_outbox_dropped_total", "Frames dropped by the drop-oldest policy.",
+                         lambda: outbox_stats.dropped)
+metrics.registry.counter("chat_outbox_spilled_total", "Frames spilled to the offline queue.",
+                         lambda: outbox_stats.spilled)
+metrics.registry.counter("chat_outbox_disconnects_total", "Clients closed by the disconnect policy.",
+                         lambda: outbox_stats.disconnected)
+
+@app.get("/metrics")
+async def get_metrics():
+    """Metrics of this worker in the Prometheus text format."""
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/stats/outbox")
+async def get_outbox_stats():
+    """Outbound queue depths of this worker and what the overflow policy did so far."""
+    depths = backend.outbox_depths()
+    return {"connections": len(depths), "queued": outbox_stats.queued,
+            "deepest": max(depths.values(), default=0), "peak_depth": outbox_stats.peak_depth,
+            "sent": outbox_stats.sent, "dropped": outbox_stats.dropped,
+            "spilled": outbox_stats.spilled, "disconnected": outbox_stats.disconnected,
+            "policy": backend.overflow, "outbox_size": backend.outbox_size}
+
+def parse_keys(handshake: str) -> tuple[str, Optional[int]]:
+    """Split the connect message into the ECC public key and the DSA key y.
+    Old clients send only the ECC public key.
+    """
+    try:
+        keys = json.loads(handshake)
+    except json.JSONDecodeError:
+        return handshake, None
+    if not isinstance(keys, dict):
+        return handshake, None
+    return keys["public_key"], int(keys["y"])
+
+async def relay_frame(username: str, frame: bytes):
+    """Forward a binary envelope by its routing header only, the body stays opaque."""
+    try:
+        sender, recipient, _ = read_route(frame)
+    except EnvelopeError:
+        backend.send_local(username, "❌ Некоректний формат повідомлення.")
+        return
+    if sender != username:
+        backend.send_local(username, "❌ Некоректний відправник.")
+        return
+    if frame[0] == CHUNK_VERSION:
+        await relay_chunk(username, recipient, frame)
+        return
+
+    backend.send_local(username, await relay_to(recipient, frame))
+
+async def relay_chunk(username: str, recipient: str, frame: bytes):
+    """Forward an attachment chunk as it arrived, never to the offline queue.
+    While the recipient has TRANSFER_WINDOW frames waiting the sender is not read,
+    so a transfer holds a few chunks here whatever the file size.
+    """
+    try:
+        _, _, transfer_id, offset, data = decode_chunk(frame)
+    except EnvelopeError:
+        backend.send_local(username, "❌ Некоректний формат повідомлення.")
+        return
+    error = transfers.check(transfer_id, username, recipient, offset, len(data))
+    if error is not None:
+        backend.send_local(username, f"❌ {error}")
+        return
+    if not await backend.deliver(recipient, frame):
+        backend.send_local(username, f"⏸ {recipient} не в мережі, передачу файлу призупинено.")
+        return
+    metrics.attachment_chunks.inc()
+    outbox = backend.connections.get(recipient)
+    if outbox is not None and len(outbox) >= TRANSFER_WINDOW:
+        try:
+            await asyncio.wait_for(outbox.flushed(), TRANSFER_STALL)
+        except asyncio.TimeoutError: # the sender waits for acks that are not coming
+            backend.send_local(username, f"⏸ {recipient} не приймає дані, передачу файлу призупинено.")
+
+async def relay_control(username: str, data: dict, text: str):
+    """Forward a transfer control message, remembering offers for relay_chunk."""
+    try:
+        control = decode_control(data)
+    except EnvelopeError:
+        backend.send_local(username, "❌ Некоректний формат повідомлення.")
+        return
+    if control["from"] != username:
+        backend.send_local(username, "❌ Некоректний відправник.")
+        return
+
+    kind = control["transfer"]
+    if kind == "offer":
+        if not transfers.offer(control["id"], username, control["to"], control["size"], control["chunk"]):
+            backend.send_local(username, "❌ Невідома передача файлу.")
+            return
+        backend.send_local(username, await relay_to(control["to"], text)) # an offline recipient gets it later
+        return
+    if kind in ("done", "cancel"):
+        transfers.close(control["id"], username)
+    await relay_to(control["to"], text)
+
 @app.websocket("/ws/{username}")
 async def websocket_endpoint(websocket: WebSocket, username: str):
     """WebSocket endpoint for chat application.
     Handles incoming messages and broadcasts them to the appropriate recipient.
     """
-    if username in connected_users:
-        await websocket.accept()
+    await websocket.accept()
+    public_key, sign_key = parse_keys(await websocket.receive_text())
+    try:
+        registered = await backend.register(username, websocket, public_key, sign_key)
+    except ConnectionError: # the broker is restarting
+        await websocket.close(code=1013)
+        return
+    if not registered:
         await websocket.send_text("__ERROR__:Username already taken")
         await websocket.close()
         return
-
-    await websocket.accept()
-    public_key = await websocket.receive_text()
-    connected_users[username] = (websocket, public_key)
     print(f"{username} підключився ✅")
 
-    # Повідомляємо всіх про новий список юзерів
-    await broadcast_users()
+    # Новому юзеру - повний список, решті - зміни
+    if sign_key is None:
+        legacy_clients.add(username)
+        backend.send_local(username, presence.legacy_snapshot())
+    else:
+        backend.send_local(username, presence.snapshot())
 
     try:
         while True:
-            data = await websocket.receive_json()
+            frame = await websocket.receive()
+            if frame["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(frame.get("code", 1000))
+
+            if frame.get("bytes") is not None:
+                metrics.bytes_in.inc(len(frame["bytes"]))
+                await relay_frame(username, frame["bytes"])
+                continue
+
+            text = frame["text"]
+            metrics.bytes_in.inc(len(text))
+            if text == "__SYNC__": # клієнт пропустив оновлення
+                backend.send_local(username, presence.snapshot())
+                continue
+
             try:
-                sender, recipient, message, iv, signature, y = data
-            except ValueError:
-                await websocket.send_text("❌ Некоректний формат повідомлення.")
+                data = json.loads(text)
+                if not isinstance(data, dict):
+                    sender, recipient, message, iv, signature, y = data
+                    check_name(recipient) # the offline queue stores it in the same header
+            except (ValueError, TypeError):
+                backend.send_local(username, "❌ Некоректний формат повідомлення.")
+                continue
+            if isinstance(data, dict): # attachment transfer
+                await relay_control(username, data, text)
+                continue
+            if sender != username:
+                backend.send_local(username, "❌ Некоректний відправник.")
                 continue
 
-            if recipient in connected_users:
-                await connected_users[recipient][0].send_json(data)
-                await websocket.send_text(f"✅ Повідомлення надіслано {recipient}")
-            else:
-                await websocket.send_text(f"❌ Користувача {recipient} не знайдено.")
+            backend.send_local(username, await relay_to(recipient, text)) # as received, no re-encoding
     except WebSocketDisconnect:
         print(f"{username} відключився ❌")
-        del connected_users[username]
-        await broadcast_users()
+    finally: # any error of a handler still frees the username
+        legacy_clients.discard(username)
+        transfers.drop_user(username)
+        await backend.unregister(username)
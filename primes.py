@@ -0,0 +1,186 @@
+"""Shared prime generation used by every scheme's key generation.
+
+Candidates are taken from an arithmetic progression (odd numbers, numbers
+congruent to 3 mod 4, numbers of the form k*q + 1, ...) and sieved in windows
+against a table of small primes, so only survivors reach Miller-Rabin.
+Every survivor gets one base-2 strong test first, and the number of extra
+random rounds is chosen by the bit size of the candidate.
+"""
+import random
+from math import gcd
+
+SIEVE_LIMIT = 1 << 13 # small primes below this bound are used for sieving
+WINDOW_SIZE = 1 << 12 # how many progression terms are sieved at once
+
+# (minimal bit size, rounds) - error below 2^-80 for random candidates
+_ROUNDS_BY_BITS = ((1300, 2), (850, 3), (650, 4), (550, 5), (450, 6), (400, 7),
+                   (350, 8), (300, 9), (250, 12), (200, 15), (150, 18))
+_MIN_ROUNDS = 27
+
+
+def _small_primes(limit):
+    """Function to list all primes below limit with the sieve of Eratosthenes."""
+    flags = bytearray([1]) * limit
+    flags[0:2] = b'\x00\x00'
+    for i in range(2, int(limit ** 0.5) + 1):
+        if flags[i]:
+            flags[i * i::i] = bytes(len(range(i * i, limit, i)))
+    return [i for i, flag in enumerate(flags) if flag]
+
+
+SMALL_PRIMES = _small_primes(SIEVE_LIMIT)
+
+
+def rounds_for_bits(bits):
+    """
+    Function to choose the number of Miller-Rabin rounds for a bit size.
+
+    bits: int - The bit length of the tested number.
+    Returns the number of rounds (base 2 included).
+    """
+    for min_bits, rounds in _ROUNDS_BY_BITS:
+        if bits >= min_bits:
+            return rounds
+    return _MIN_ROUNDS
+
+
+def miller_rabin(n, k=None):
+    """
+    Function to check if a number is prime using Miller-Rabin primality test.
+
+    n: int - The number to check for primality.
+    k: int - The number of iterations for accuracy, chosen by bit size if None.
+    Returns True if n is probably prime, False if n is composite.
+    """
+    if n <= 1:
+        return False
+    if n <= 3:
+        return True
+    if n % 2 == 0:
+        return False
+
+    r, d = 0, n - 1
+    while d % 2 == 0:
+        d //= 2
+        r += 1
+
+    if k is None:
+        k = rounds_for_bits(n.bit_length())
+
+    # base 2 first - it rejects almost every composite that survived the sieve
+    bases = [2] + [random.randint(3, n - 2) for _ in range(k - 1)]
+    for a in bases:
+        x = pow(a, d, n)
+
+        if x == 1 or x == n - 1:
+            continue
+
+        for _ in range(r - 1):
+            x = pow(x, 2, n)
+            if x == n - 1:
+                break
+        else:
+            return False
+
+    return True
+
+
+def is_probable_prime(n, rounds=None):
+    """
+    Function to check if a number is prime.
+
+    Trial division by the small prime table, then Miller-Rabin.
+    """
+    if n < 2:
+        return False
+    for p in SMALL_PRIMES:
+        if n % p == 0:
+            return n == p
+    if n < SIEVE_LIMIT * SIEVE_LIMIT:
+        return True
+    return miller_rabin(n, rounds)
+
+
+def prime_in_progression(start, step, limit=None, rounds=None):
+    """
+    Function to find the first probable prime of the form start + i * step.
+
+    start: int - The first candidate.
+    step: int - The distance between candidates, must be coprime with start.
+    limit: int - The largest allowed candidate, None for no bound.
+    Returns the prime, or None if there is none up to limit.
+    """
+    if step <= 0 or gcd(start, step) != 1:
+        raise ValueError('start and step must be coprime and step positive')
+
+    # tiny candidates could be crossed out by their own entry in the sieve
+    while start <= SMALL_PRIMES[-1]:
+        if limit is not None and start > limit:
+            return None
+        if is_probable_prime(start, rounds):
+            return start
+        start += step
+
+    inverses = [(p, pow(step, -1, p)) for p in SMALL_PRIMES if step % p]
+    while limit is None or start <= limit:
+        size = WINDOW_SIZE if limit is None else min(WINDOW_SIZE, (limit - start) // step + 1)
+        flags = bytearray([1]) * size
+        for p, inv in inverses:
+            i = (-start * inv) % p # first index where start + i * step is divisible by p
+            if i < size:
+                flags[i::p] = bytes(len(range(i, size, p)))
+
+        i = flags.find(1)
+        while i != -1:
+            candidate = start + i * step
+            if miller_rabin(candidate, rounds):
+                return candidate
+            i = flags.find(1, i + 1)
+
+        start += size * step
+
+    return None
+
+
+def prime_in_range(min_value, max_value, residue=1, modulus=2, rounds=None):
+    """
+    Function to generate a random prime p with min_value <= p <= max_value.
+
+    residue, modulus: int - The prime also satisfies p % modulus == residue.
+    The search starts at a random point and wraps around to min_value.
+    """
+    def align(value):
+        return value + (residue - value) % modulus
+
+    start = align(random.randint(min_value, max_value))
+    prime = prime_in_progression(start, modulus, max_value, rounds)
+    if prime is None:
+        prime = prime_in_progression(align(min_value), modulus, start - 1, rounds)
+    if prime is None:
+        raise ValueError('There is no prime in the given range')
+    return prime
+
+
+def random_prime(bitsize, rounds=None):
+    """
+    Function to generate a large prime number.
+
+    Returns a prime number of exactly bitsize bits.
+    """
+    return prime_in_range(1 << (bitsize - 1), (1 << bitsize) - 1, rounds=rounds)
+
+
+def strong_prime(bitsize, q, rounds=None):
+    """
+    Function to generate a prime p of exactly bitsize bits with q | p - 1.
+
+    Candidates are p = k * q + 1 with even k, sieved as one progression.
+    """
+    k_min = -(-((1 << (bitsize - 1)) - 1) // q)
+    k_max = ((1 << bitsize) - 2) // q
+    while True:
+        k = random.randint(k_min, k_max)
+        k += k % 2
+        prime = prime_in_progression(k * q + 1, 2 * q, (1 << bitsize) - 1, rounds)
+        if prime is not None:
+            return prime
@@ -0,0 +1,95 @@
+"""Local pub/sub broker that lets several server workers share presence and routing.
+
+Workers connect over a Unix socket. The broker is the single owner of the
+user directory (username -> worker, keys): it answers username claims,
+announces joins and leaves to every worker, and forwards routed frames to
+the worker the recipient is connected to. A frame for a user who has
+already left goes back to the worker that sent it, which queues it offline.
+
+Frames on the socket are
+
+    total length: 4 bytes, header length: 2 bytes, header: JSON, body: bytes
+
+Run it with `python -m relay.broker /tmp/messenger.sock` and start the
+workers with CHAT_BROKER=/tmp/messenger.sock.
+"""
+import asyncio
+import json
+import struct
+import sys
+
+
+async def read_frame(reader: asyncio.StreamReader) -> tuple[dict, bytes]:
+    """Read one frame, raises asyncio.IncompleteReadError when the peer is gone."""
+    total, header_len = struct.unpack('>IH', await reader.readexactly(6))
+    data = await reader.readexactly(total - 2)
+    return json.loads(data[:header_len]), data[header_len:]
+
+
+def write_frame(writer: asyncio.StreamWriter, header: dict, body: bytes = b''):
+    """Queue one frame on the writer, the caller drains."""
+    raw = json.dumps(header).encode()
+    writer.write(struct.pack('>IH', 2 + len(raw) + len(body), len(raw)) + raw + body)
+
+
+class Broker:
+    """The broker process state."""
+    def __init__(self):
+        self.workers: set[asyncio.StreamWriter] = set()
+        self.directory: dict[str, tuple[asyncio.StreamWriter, str, int]] = {}
+
+    async def serve(self, path: str):
+        """Listen on a Unix socket until cancelled."""
+        server = await asyncio.start_unix_server(self.handle_worker, path)
+        async with server:
+            await server.serve_forever()
+
+    async def _announce(self, header: dict):
+        for worker in list(self.workers):
+            write_frame(worker, header)
+        await asyncio.gather(*(worker.drain() for worker in list(self.workers)), return_exceptions=True)
+
+    async def handle_worker(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Serve one worker; its users are released when it goes away."""
+        self.workers.add(writer)
+        for username, (_, public_key, sign_key) in self.directory.items():
+            write_frame(writer, {"op": "join", "user": username, "public_key": public_key, "y": sign_key})
+        await writer.drain()
+
+        try:
+            while True:
+                header, body = await read_frame(reader)
+                op = header["op"]
+                if op == "claim":
+                    username = header["user"]
+                    ok = username not in self.directory
+                    if ok:
+                        self.directory[username] = (writer, header["public_key"], header["y"])
+                    write_frame(writer, {"op": "claimed", "id": header["id"], "ok": ok})
+                    if ok:
+                        await self._announce({"op": "join", "user": username,
+                                              "public_key": header["public_key"], "y": header["y"]})
+                elif op == "release":
+                    entry = self.directory.get(header["user"])
+                    if entry is not None and entry[0] is writer:
+                        del self.directory[header["user"]]
+                        await self._announce({"op": "leave", "user": header["user"]})
+                elif op == "route":
+                    entry = self.directory.get(header["to"])
+                    # the sender's worker saw the user online, it keeps the frame if that changed
+                    target, op = (entry[0], "deliver") if entry is not None else (writer, "missed")
+                    write_frame(target, {"op": op, "to": header["to"], "text": header["text"]}, body)
+                    await target.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.workers.discard(writer)
+            gone = [username for username, entry in self.directory.items() if entry[0] is writer]
+            for username in gone:
+                del self.directory[username]
+                await self._announce({"op": "leave", "user": username})
+            writer.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(Broker().serve(sys.argv[1] if len(sys.argv) > 1 else "/tmp/messenger.sock"))
@@ -0,0 +1,105 @@
+"""Process metrics of the chat server in the Prometheus text format.
+
+Everything runs on one event loop, so counters are plain attributes
+incremented in place: no locks, and observing a value allocates nothing
+beyond the number itself. Values that already exist elsewhere (connection
+counts, outbox stats) are read through a callback only when /metrics is
+scraped.
+"""
+import asyncio
+import time
+from bisect import bisect_left
+from typing import Callable, Optional
+
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+LAG_INTERVAL = 0.5 # seconds between event loop lag probes
+
+
+class Metric:
+    """A counter or a gauge. With `read` set the value is taken from it at scrape time."""
+    def __init__(self, name: str, kind: str, help_text: str, read: Optional[Callable[[], float]] = None):
+        self.name = name
+        self.kind = kind
+        self.help = help_text
+        self.read = read
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def set(self, value):
+        self.value = value
+
+    def render(self) -> list[str]:
+        value = self.read() if self.read is not None else self.value
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}", f"{self.name} {value}"]
+
+
+class Histogram:
+    """Fixed buckets, cumulative counts are only built at scrape time."""
+    def __init__(self, name: str, help_text: str, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1) # the last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            lines.append(f'{self.name}_bucket{{le="{bound}"}} {total}')
+        lines.append(f'{self.name}_bucket{{le="+Inf"}} {self.count}')
+        lines.append(f"{self.name}_sum {self.sum}")
+        lines.append(f"{self.name}_count {self.count}")
+        return lines
+
+
+class Registry:
+    """All metrics of the process, in the order they are rendered."""
+    def __init__(self):
+        self.metrics = []
+
+    def counter(self, name, help_text, read=None) -> Metric:
+        return self._add(Metric(name, "counter", help_text, read))
+
+    def gauge(self, name, help_text, read=None) -> Metric:
+        return self._add(Metric(name, "gauge", help_text, read))
+
+    def histogram(self, name, help_text, buckets=LATENCY_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help_text, buckets))
+
+    def render(self) -> str:
+        return "\n".join(line for metric in self.metrics for line in metric.render()) + "\n"
+
+    def _add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+
+registry = Registry()
+
+messages_relayed = registry.counter("chat_messages_relayed_total", "Frames handed to a recipient's connection or worker.")
+messages_queued = registry.counter("chat_messages_queued_total", "Frames stored for recipients who were offline.")
+attachment_chunks = registry.counter("chat_attachment_chunks_total", "Attachment chunks forwarded to a recipient.")
+routing_misses = registry.counter("chat_routing_misses_total", "Frames that could be neither delivered nor queued.")
+bytes_in = registry.counter("chat_bytes_in_total", "Bytes received from clients (characters for text frames).")
+bytes_out = registry.counter("chat_bytes_out_total", "Bytes written to clients (characters for text frames).")
+send_seconds = registry.histogram("chat_send_seconds", "Time to write one frame to a client socket.")
+presence_seconds = registry.histogram("chat_presence_broadcast_seconds", "Time to queue one presence update for all local clients.")
+loop_lag = registry.histogram("chat_event_loop_lag_seconds", "How late the event loop woke up a sleeping task.")
+
+
+async def probe_loop_lag(interval: float = LAG_INTERVAL):
+    """Run forever, measuring how much later than asked a sleep returns."""
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        loop_lag.observe(max(0.0, time.perf_counter() - start - interval))
@@ -0,0 +1,299 @@
+"""Durable store-and-forward queue for users who are offline.
+
+Frames for offline recipients are appended to a segmented log on disk:
+
+    <directory>/00000001.seg, 00000002.seg, ...
+
+Each record is
+
+    length of the rest: 4 bytes, kind: 1 byte, seq: 8 bytes,
+    recipient length: 1 byte, recipient: utf-8, payload
+
+where kind is a text frame, a binary frame or an acknowledgment. An
+acknowledgment has no payload and its seq means "everything of this
+recipient up to seq was delivered". Only a small in-memory index
+(recipient -> seq -> segment, offset, length) is kept; payloads are read
+back through mmap when the recipient connects.
+
+A segment is deleted once everything in it is acknowledged. A segment that
+is mostly acknowledged is compacted: its few live records are copied to
+the active segment first. Segments are always removed oldest first, so an
+acknowledgment record is never dropped while a record it covers survives,
+and the index can be rebuilt by scanning the log after a restart.
+"""
+import fcntl
+import mmap
+import os
+import struct
+from collections import OrderedDict
+from typing import Dict, Union
+
+Frame = Union[str, bytes]
+
+SEGMENT_SIZE = 64 * 1024 * 1024
+COMPACT_RATIO = 0.25 # compact the oldest segment once less than this part of it is live
+MAX_PER_RECIPIENT = 100_000
+MAX_FRAMES = 1_000_000 # in the whole store, however many recipients they are for
+
+TEXT, BINARY, ACK = 0, 1, 2
+_HEAD = struct.Struct('>IBQB')
+
+
+def _location(segment, offset, length):
+    ## one int per queued frame instead of a tuple keeps the index small
+    return segment << 64 | offset << 32 | length
+
+
+def _unpack(location):
+    return location >> 64, location >> 32 & 0xFFFFFFFF, location & 0xFFFFFFFF
+
+
+class OfflineStore:
+    """
+    Append-only segmented log of frames waiting for their recipients.
+
+    Not thread-safe, meant to be used from the server's event loop.
+    """
+    def __init__(self, directory: str, segment_size: int = SEGMENT_SIZE,
+                 max_per_recipient: int = MAX_PER_RECIPIENT, max_frames: int = MAX_FRAMES):
+        self.directory = directory
+        self.segment_size = segment_size
+        self.max_per_recipient = max_per_recipient
+        self.max_frames = max_frames
+        os.makedirs(directory, exist_ok=True)
+
+        self._index: Dict[str, OrderedDict] = {} # recipient -> seq -> packed (segment, offset, length)
+        self._live: Dict[int, list] = {} # segment -> [live records, live bytes]
+        self._sizes: Dict[int, int] = {}
+        self._maps: Dict[int, mmap.mmap] = {}
+        self._frames = 0 # queued frames of all recipients
+        self._next_seq = 1
+        self._active = None
+        self._file = None
+        self.lock = None # the slot lock of open_store
+        self._load()
+
+    def __len__(self):
+        return self._frames
+
+    def pending(self, recipient: str) -> int:
+        """How many frames wait for a recipient."""
+        queue = self._index.get(recipient)
+        return len(queue) if queue else 0
+
+    def append(self, recipient: str, frame: Frame) -> bool:
+        """Queue a frame. Returns False if the recipient's queue or the whole store is full."""
+        if self._frames >= self.max_frames:
+            return False
+        queue = self._index.setdefault(recipient, OrderedDict())
+        if len(queue) >= self.max_per_recipient:
+            return False
+
+        binary = isinstance(frame, bytes)
+        payload = frame if binary else frame.encode()
+        seq = self._next_seq
+        self._next_seq += 1
+        offset, length = self._write(BINARY if binary else TEXT, seq, recipient, payload)
+        queue[seq] = _location(self._active, offset, length)
+        self._count(self._active, 1, length)
+        self._frames += 1
+        return True
+
+    def peek(self, recipient: str, limit: int) -> list[tuple[int, Frame]]:
+        """Up to `limit` oldest frames of a recipient as (seq, frame), still queued until ack()."""
+        queue = self._index.get(recipient)
+        if not queue:
+            return []
+        self._file.flush()
+
+        batch = []
+        for seq, location in queue.items():
+            if len(batch) >= limit:
+                break
+            kind, _, _, payload = self._read(*_unpack(location))
+            batch.append((seq, payload if kind == BINARY else payload.decode()))
+        return batch
+
+    def ack(self, recipient: str, seq: int):
+        """Drop the recipient's frames up to seq, they were delivered."""
+        queue = self._index.get(recipient)
+        if not queue:
+            return
+        while queue:
+            first = next(iter(queue))
+            if first > seq:
+                break
+            segment, _, length = _unpack(queue.popitem(last=False)[1])
+            self._count(segment, -1, -length)
+            self._frames -= 1
+        if not queue:
+            del self._index[recipient]
+
+        self._write(ACK, seq, recipient, b'')
+        self.compact()
+
+    def compact(self):
+        """Remove fully delivered segments and rewrite mostly delivered ones, oldest first."""
+        while len(self._sizes) > 1:
+            oldest = min(self._sizes)
+            records, live_bytes = self._live.get(oldest, (0, 0))
+            if records and live_bytes >= self._sizes[oldest] * COMPACT_RATIO:
+                break
+            if records:
+                self._move_live(oldest)
+            self._drop(oldest)
+
+    def close(self):
+        """Flush the active segment to disk and unmap everything."""
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
+        for segment_map in self._maps.values():
+            segment_map.close()
+        self._maps.clear()
+
+    def _path(self, segment):
+        return os.path.join(self.directory, f'{segment:08d}.seg')
+
+    def _count(self, segment, records, size):
+        live = self._live.setdefault(segment, [0, 0])
+        live[0] += records
+        live[1] += size
+
+    def _write(self, kind, seq, recipient, payload):
+        """Append a record to the active segment, returns its (offset, length)."""
+        name = recipient.encode()
+        record = _HEAD.pack(_HEAD.size - 4 + len(name) + len(payload), kind, seq, len(name)) + name + payload
+        if self._file is None or self._sizes[self._active] + len(record) > self.segment_size:
+            self._roll()
+
+        offset = self._sizes[self._active]
+        self._file.write(record)
+        self._sizes[self._active] = offset + len(record)
+        return offset, len(record)
+
+    def _roll(self):
+        """Seal the active segment and start a new one."""
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+        self._active = (self._active or 0) + 1
+        self._file = open(self._path(self._active), 'ab')
+        self._sizes[self._active] = 0
+
+    def _map(self, segment, end):
+        """mmap of a segment covering at least `end` bytes, remapped as the active one grows."""
+        segment_map = self._maps.get(segment)
+        if segment_map is None or len(segment_map) < end:
+            if segment_map is not None:
+                segment_map.close()
+            with open(self._path(segment), 'rb') as f:
+                segment_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[segment] = segment_map
+        return segment_map
+
+    def _read(self, segment, offset, length):
+        segment_map = self._map(segment, offset + length)
+        _, kind, seq, name_len = _HEAD.unpack_from(segment_map, offset)
+        start = offset + _HEAD.size
+        name = segment_map[start:start + name_len].decode()
+        return kind, seq, name, segment_map[start + name_len:offset + length]
+
+    def _records(self, segment):
+        """Yields (offset, length, kind, seq, recipient) of every record in a segment."""
+        size = self._sizes[segment]
+        offset = 0
+        while offset + _HEAD.size <= size:
+            rest, kind, seq, name_len = _HEAD.unpack_from(self._map(segment, size), offset)
+            length = 4 + rest
+            if offset + length > size:
+                break
+            name = self._maps[segment][offset + _HEAD.size:offset + _HEAD.size + name_len].decode()
+            yield offset, length, kind, seq, name
+            offset += length
+
+    def _move_live(self, segment):
+        """Copy the live records of a segment to the active one."""
+        for offset, length, kind, seq, recipient in list(self._records(segment)):
+            queue = self._index.get(recipient)
+            if kind == ACK or not queue or seq not in queue or _unpack(queue[seq])[0] != segment:
+                continue
+            payload = self._read(segment, offset, length)[3]
+            new_offset, new_length = self._write(kind, seq, recipient, payload)
+            queue[seq] = _location(self._active, new_offset, new_length) # keeps its place in the queue
+            self._count(segment, -1, -length)
+            self._count(self._active, 1, new_length)
+
+    def _drop(self, segment):
+        segment_map = self._maps.pop(segment, None)
+        if segment_map is not None:
+            segment_map.close()
+        self._sizes.pop(segment)
+        self._live.pop(segment, None)
+        os.remove(self._path(segment))
+
+    def _load(self):
+        """Rebuild the index from the segments on disk, cutting off a torn last record."""
+        segments = sorted(int(name[:-4]) for name in os.listdir(self.directory) if name.endswith('.seg'))
+        found: Dict[str, Dict[int, tuple]] = {}
+        acked: Dict[str, int] = {}
+        for segment in segments:
+            self._sizes[segment] = os.path.getsize(self._path(segment))
+            if not self._sizes[segment]:
+                continue
+            end = 0
+            for offset, length, kind, seq, recipient in self._records(segment):
+                end = offset + length
+                self._next_seq = max(self._next_seq, seq + 1)
+                if kind == ACK:
+                    acked[recipient] = max(acked.get(recipient, 0), seq)
+                else:
+                    found.setdefault(recipient, {})[seq] = _location(segment, offset, length)
+            if end < self._sizes[segment]:
+                if segment in self._maps:
+                    self._maps.pop(segment).close()
+                os.truncate(self._path(segment), end)
+                self._sizes[segment] = end
+
+        for recipient, records in found.items():
+            live = sorted(seq for seq in records if seq > acked.get(recipient, 0))
+            if live:
+                self._index[recipient] = OrderedDict((seq, records[seq]) for seq in live)
+                self._frames += len(live)
+                for seq in live:
+                    segment, _, length = _unpack(records[seq])
+                    self._count(segment, 1, length)
+
+        if segments:
+            self._active = segments[-1]
+            self._file = open(self._path(self._active), 'ab')
+        else:
+            self._roll()
+        self.compact()
+
+
+def open_store(root: str, **kwargs) -> OfflineStore:
+    """
+    Open the first store under `root` no other process holds.
+
+    Every worker gets a slot directory of its own (root/0, root/1, ...)
+    and takes over the same slots after a restart.
+    """
+    slot = 0
+    while True:
+        directory = os.path.join(root, str(slot))
+        os.makedirs(directory, exist_ok=True)
+        lock = open(os.path.join(directory, 'lock'), 'w')
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock.close()
+            slot += 1
+            continue
+        store = OfflineStore(directory, **kwargs)
+        store.lock = lock # held for the life of the process
+        return store
+
@@ -0,0 +1,161 @@
+"""Bounded per-connection send queues with a dedicated writer task.
+
+Every connection gets an Outbox. Senders only put frames into it and never
+await the recipient's socket, so a slow or stalled connection cannot hold
+up anyone else. When the queue is full the overflow policy decides:
+
+    drop-oldest - forget the oldest queued frame
+    disconnect  - close the connection, the client reconnects and resyncs
+    spill       - keep this and every following frame in the offline store
+                  until the queue has emptied, then send them from there
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Callable, Optional, Union
+
+from fastapi import WebSocket
+
+from relay import metrics
+
+Frame = Union[str, bytes]
+
+DROP_OLDEST = "drop-oldest"
+DISCONNECT = "disconnect"
+SPILL = "spill"
+POLICIES = (DROP_OLDEST, DISCONNECT, SPILL)
+
+OUTBOX_SIZE = 1024 # frames
+
+
+async def send_frame(websocket: WebSocket, frame: Frame):
+    """Send a text or a binary frame, whichever it is."""
+    if isinstance(frame, bytes):
+        await websocket.send_bytes(frame)
+    else:
+        await websocket.send_text(frame)
+
+
+class OutboxStats:
+    """
+    Counters over all outboxes of the process.
+    Plain attributes: everything runs on one event loop, so no locks.
+    """
+    def __init__(self):
+        self.queued = 0 # frames waiting in all outboxes right now
+        self.peak_depth = 0 # the deepest any single outbox has been
+        self.sent = 0
+        self.dropped = 0
+        self.spilled = 0
+        self.disconnected = 0
+
+
+stats = OutboxStats()
+
+
+class Outbox:
+    """
+    Frames waiting for one connection, written by the connection's own task.
+
+    spill(frame) -> bool stores a frame for later and on_drained() is called
+    once the queue has emptied after spilling; without them the spill policy
+    falls back to disconnect.
+    """
+    def __init__(self, websocket: WebSocket, maxsize: int = OUTBOX_SIZE, policy: str = SPILL,
+                 spill: Optional[Callable[[Frame], bool]] = None,
+                 on_drained: Optional[Callable[[], None]] = None):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown overflow policy {policy}")
+        self.websocket = websocket
+        self.maxsize = maxsize
+        self.policy = policy
+        self.spill = spill
+        self.on_drained = on_drained
+
+        self._frames: deque = deque()
+        self._ready = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._spilling = False
+        self._closed = False
+        self._closing = None
+        self._writer = asyncio.create_task(self._write())
+
+    def __len__(self):
+        return len(self._frames)
+
+    def put(self, frame: Frame) -> bool:
+        """Queue a frame without waiting. Returns False if the connection is (being) closed."""
+        if self._closed:
+            return False
+        if self._spilling:
+            return self._spill(frame)
+
+        if len(self._frames) >= self.maxsize:
+            if self.policy == DROP_OLDEST:
+                self._frames.popleft()
+                stats.queued -= 1
+                stats.dropped += 1
+            elif self.policy == SPILL and self.spill is not None:
+                self._spilling = True # later frames follow, or they would overtake
+                return self._spill(frame)
+            else:
+                stats.disconnected += 1
+                self._closing = asyncio.create_task(self.websocket.close(code=1013))
+                self._closed = True # what is queued stays for close(), called on unregister
+                self._writer.cancel()
+                self._idle.set()
+                return False
+
+        self._frames.append(frame)
+        stats.queued += 1
+        if len(self._frames) > stats.peak_depth:
+            stats.peak_depth = len(self._frames)
+        self._idle.clear()
+        self._ready.set()
+        return True
+
+    async def flushed(self):
+        """Wait until everything queued so far has been written (or the connection is gone)."""
+        await self._idle.wait()
+
+    def close(self) -> list[Frame]:
+        """Stop the writer, returns the frames it did not get to."""
+        self._closed = True
+        self._writer.cancel()
+        left = list(self._frames)
+        self._frames.clear()
+        stats.queued -= len(left)
+        self._idle.set()
+        return left
+
+    def _spill(self, frame):
+        if not self.spill(frame):
+            return False
+        stats.spilled += 1
+        return True
+
+    async def _write(self):
+        try:
+            while True:
+                if not self._frames:
+                    self._idle.set()
+                    if self._spilling:
+                        self._spilling = False
+                        self.on_drained() # the spilled frames go out from the store now
+                    self._ready.clear()
+                    await self._ready.wait()
+                    continue
+                frame = self._frames.popleft()
+                stats.queued -= 1
+                start = time.perf_counter()
+                await send_frame(self.websocket, frame)
+                metrics.send_seconds.observe(time.perf_counter() - start)
+                metrics.bytes_out.inc(len(frame))
+                stats.sent += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e: # the connection is gone, the endpoint unregisters it
+            print(f"❌ Не вдалося надіслати: {e}")
+            self._closed = True
+            self._idle.set()
@@ -0,0 +1,71 @@
+"""Versioned, coalesced presence updates for the chat server."""
+import asyncio
+from typing import Awaitable, Callable
+
+PRESENCE_WINDOW = 0.05 # seconds to collect joins/leaves into one update
+
+
+class Presence:
+    """
+    Keeps the set of online users and a version number.
+
+    Joins and leaves within PRESENCE_WINDOW are merged into one delta,
+    __PRESENCE__:<old version>:<new version>:+alice,-bob, which `send`
+    delivers to everyone. A full __USERS__:<version>:<users> snapshot is
+    only sent on connect or when a client reports a version gap.
+
+    A user who leaves and joins again within one window (a reconnect,
+    likely with new keys) shows up in the delta as -name,+name, so clients
+    drop what they cached for the old session.
+    """
+    def __init__(self, send: Callable[[str], Awaitable[None]], window: float = PRESENCE_WINDOW):
+        self.send = send
+        self.window = window
+        self.version = 0
+        self.members: set[str] = set()
+        self._published: set[str] = set() # members as of self.version
+        self._left: set[str] = set() # left since the last update
+        self._flush_task = None
+
+    def snapshot(self) -> str:
+        """Full user list as of self.version, pending changes arrive with the next delta."""
+        return f"__USERS__:{self.version}:{','.join(self._published)}"
+
+    def legacy_snapshot(self) -> str:
+        """Full user list in the unversioned __USERS__:<users> format of old clients."""
+        return f"__USERS__:{','.join(self._published)}"
+
+    def join(self, username: str):
+        """Mark a user online."""
+        self.members.add(username)
+        self._schedule()
+
+    def leave(self, username: str):
+        """Mark a user offline."""
+        self.members.discard(username)
+        self._left.add(username)
+        self._schedule()
+
+    def _schedule(self):
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.window)
+        self._flush_task = None
+        await self.flush()
+
+    async def flush(self):
+        """Send the net changes since the last update as one delta."""
+        joined = self.members - self._published
+        left = self._published - self.members
+        rejoined = self._published & self.members & self._left
+        self._left = set()
+        if not joined and not left and not rejoined:
+            return
+
+        self._published = set(self.members)
+        old_version, self.version = self.version, self.version + 1
+        changes = [f"+{name}" for name in joined] + [f"-{name}" for name in left]
+        changes += [change for name in rejoined for change in (f"-{name}", f"+{name}")]
+        await self.send(f"__PRESENCE__:{old_version}:{self.version}:{','.join(changes)}")
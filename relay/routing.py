@@ -0,0 +1,253 @@
+"""Presence and routing backends for the chat server.
+
+A backend knows who is online (with their keys), which connections live
+in this process, and how to get a frame to any online user. LocalBackend
+keeps everything in one process. BrokerBackend shares the directory with
+other workers through relay.broker, so a user connected to any worker can
+be reached from every other one.
+"""
+import asyncio
+import itertools
+from typing import Callable, Dict, Optional
+
+from fastapi import WebSocket
+
+from relay.broker import read_frame, write_frame
+from relay.outbox import OUTBOX_SIZE, SPILL, Frame, Outbox
+from relay.presence import Presence
+
+RECONNECT_DELAY = 1.0 # seconds between attempts to reach a lost broker
+
+
+class LocalBackend:
+    """
+    All users are connected to this process, the default.
+
+    Frames for a local user go through the user's Outbox. With `spill`
+    set, frames that do not fit (and those still queued when the user
+    disconnects) are handed to it, and `on_drained` is told when an
+    overflowing outbox has caught up.
+    """
+    def __init__(self, presence: Presence, outbox_size: int = OUTBOX_SIZE, overflow: str = SPILL):
+        self.presence = presence
+        self.outbox_size = outbox_size
+        self.overflow = overflow
+        self.connections: Dict[str, Outbox] = {}
+        self.directory: Dict[str, tuple[str, Optional[int]]] = {} # username -> (public key, y)
+        self.on_join: Optional[Callable[[str], None]] = None # called for every user who comes online
+        self.spill: Optional[Callable[[str, Frame], bool]] = None
+        self.on_drained: Optional[Callable[[str], None]] = None
+
+    async def start(self):
+        """Prepare the backend, called on server startup."""
+
+    async def stop(self):
+        """Release the backend, called on server shutdown."""
+
+    async def register(self, username: str, websocket: WebSocket,
+                       public_key: str, sign_key: Optional[int]) -> bool:
+        """Add a connection. Returns False if the username is already taken."""
+        if username in self.directory:
+            return False
+        self.connections[username] = self._outbox(username, websocket)
+        self._joined(username, public_key, sign_key)
+        return True
+
+    async def unregister(self, username: str):
+        """Remove a connection of this process."""
+        self._drop_outbox(username)
+        self._left(username)
+
+    def is_online(self, username: str) -> bool:
+        """Whether the user is connected anywhere."""
+        return username in self.directory
+
+    def keys(self, username: str) -> Optional[tuple[str, Optional[int]]]:
+        """The (public key, y) a user published when connecting, None if offline."""
+        return self.directory.get(username)
+
+    def local_users(self) -> list[str]:
+        """Users connected to this process."""
+        return list(self.connections)
+
+    def send_local(self, username: str, frame: Frame) -> bool:
+        """Queue a frame for a user of this process, never waits for the socket."""
+        outbox = self.connections.get(username)
+        return outbox is not None and outbox.put(frame)
+
+    async def deliver(self, recipient: str, frame: Frame) -> bool:
+        """Get a frame to a user. Returns False if the user is offline."""
+        return self.send_local(recipient, frame)
+
+    async def flushed(self, username: str):
+        """Wait until the frames queued for a local user so far have been written."""
+        outbox = self.connections.get(username)
+        if outbox is not None:
+            await outbox.flushed()
+
+    def outbox_depths(self) -> Dict[str, int]:
+        """Queued frames per local user."""
+        return {username: len(outbox) for username, outbox in self.connections.items()}
+
+    def _outbox(self, username, websocket):
+        spill = on_drained = None
+        if self.spill is not None:
+            spill = lambda frame: self.spill(username, frame)
+        if self.on_drained is not None:
+            on_drained = lambda: self.on_drained(username)
+        return Outbox(websocket, self.outbox_size, self.overflow, spill, on_drained)
+
+    def _drop_outbox(self, username):
+        """Stop a user's writer, keeping what it had not sent yet."""
+        outbox = self.connections.pop(username, None)
+        if outbox is None:
+            return
+        for frame in outbox.close():
+            if self.spill is None or not self.spill(username, frame):
+                break
+
+    def _joined(self, username, public_key, sign_key):
+        self.directory[username] = (public_key, sign_key)
+        self.presence.join(username)
+        if self.on_join is not None:
+            self.on_join(username)
+
+    def _left(self, username):
+        if self.directory.pop(username, None) is not None:
+            self.presence.leave(username)
+
+
+class BrokerBackend(LocalBackend):
+    """
+    Users are spread over several worker processes sharing one relay.broker.
+
+    self.directory is a replica of the broker's directory, kept up to date
+    from its join/leave announcements; self.connections holds only the
+    users connected to this worker. Frames routed here by other workers
+    go into the local outboxes too, so the broker connection never waits
+    for a slow socket.
+
+    If the broker goes away, pending claims fail with ConnectionError and the
+    local connections are closed (the broker has released their names, so the
+    clients reconnect), then the backend reconnects in the background.
+    """
+    def __init__(self, presence: Presence, path: str, **outbox_options):
+        super().__init__(presence, **outbox_options)
+        self.path = path
+        self._reader = None
+        self._writer = None
+        self._listener = None
+        self._requests = itertools.count()
+        self._pending: Dict[int, asyncio.Future] = {}
+
+    async def start(self):
+        await self._connect()
+        self._listener = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+        if self._writer is not None:
+            self._writer.close()
+
+    async def _connect(self):
+        self._reader, self._writer = await asyncio.open_unix_connection(self.path)
+
+    async def _send(self, header, body=b''):
+        if self._writer is None:
+            raise ConnectionError("Broker is not connected")
+        write_frame(self._writer, header, body)
+        await self._writer.drain()
+
+    async def register(self, username, websocket, public_key, sign_key):
+        """Claim a username through the broker, raises ConnectionError if it is unreachable."""
+        request = next(self._requests)
+        claimed = asyncio.get_running_loop().create_future()
+        self._pending[request] = claimed
+        try:
+            await self._send({"op": "claim", "id": request, "user": username,
+                              "public_key": public_key, "y": sign_key})
+            if not await claimed:
+                return False
+        finally:
+            self._pending.pop(request, None)
+
+        self.connections[username] = self._outbox(username, websocket)
+        self._joined(username, public_key, sign_key) # the broker's announcement repeats it
+        return True
+
+    async def unregister(self, username):
+        self._drop_outbox(username)
+        self._left(username)
+        try:
+            await self._send({"op": "release", "user": username})
+        except ConnectionError:
+            pass # the broker already released everyone of this worker
+
+    async def deliver(self, recipient, frame):
+        if recipient in self.connections:
+            return await super().deliver(recipient, frame)
+        if recipient not in self.directory:
+            return False
+
+        text = isinstance(frame, str)
+        try:
+            await self._send({"op": "route", "to": recipient, "text": text},
+                             frame.encode() if text else frame)
+        except ConnectionError:
+            return False
+        return True
+
+    async def _run(self):
+        while True:
+            try:
+                await self._listen()
+            except Exception as e: # closed socket, broken frame: never die silently
+                print(f"❌ З'єднання з брокером втрачено: {e!r}")
+            await self._disconnected()
+            while True:
+                await asyncio.sleep(RECONNECT_DELAY)
+                try:
+                    await self._connect()
+                    break
+                except OSError:
+                    continue
+
+    async def _listen(self):
+        while True:
+            header, body = await read_frame(self._reader)
+            op = header["op"]
+            if op == "claimed":
+                claimed = self._pending.get(header["id"])
+                if claimed is not None and not claimed.done():
+                    claimed.set_result(header["ok"])
+            elif op == "join":
+                self._joined(header["user"], header["public_key"], header["y"])
+            elif op == "leave":
+                self._left(header["user"])
+            elif op == "deliver":
+                frame = body.decode() if header["text"] else body
+                if not self.send_local(header["to"], frame) and self.spill is not None:
+                    self.spill(header["to"], frame) # left while the frame was on its way
+            elif op == "missed": # left before the broker got the frame
+                if self.spill is not None and self.spill(header["to"], body.decode() if header["text"] else body) \
+                        and header["to"] in self.directory and self.on_join is not None:
+                    self.on_join(header["to"]) # already back, its queue is sent now
+
+    async def _disconnected(self):
+        """Fail what waits on the broker and drop the state it owned."""
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+
+        for claimed in self._pending.values():
+            if not claimed.done():
+                claimed.set_exception(ConnectionError("Broker connection lost"))
+        for username in list(self.directory):
+            self._left(username)
+
+        websockets = [self.connections[username].websocket for username in list(self.connections)]
+        for username in list(self.connections):
+            self._drop_outbox(username)
+        await asyncio.gather(*(websocket.close(code=1012) for websocket in websockets),
+                             return_exceptions=True)
@@ -0,0 +1,79 @@
+"""Attachment transfers the server is relaying.
+
+The server never assembles a file: every chunk frame is forwarded as soon
+as it arrives. It only remembers the offers, so that a chunk is forwarded
+only for a transfer its sender offered to its recipient, at a chunk
+boundary inside the offered size. Pacing is end to end (the recipient's
+accept and ack messages); the server's own memory is bounded by not
+reading a sender's socket while its recipient has TRANSFER_WINDOW frames
+waiting.
+"""
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional
+
+from envelope import CHUNK_OVERHEAD
+
+TRANSFER_WINDOW = 4 # frames queued for a recipient before the sender is not read
+TRANSFER_STALL = 30.0 # seconds to wait for a recipient's queue to drain before telling the sender
+MAX_TRANSFERS = 16 # remembered offers per sender, the oldest is forgotten first
+
+
+class Transfer(NamedTuple):
+    sender: str
+    recipient: str
+    size: int
+    chunk: int
+
+
+class Transfers:
+    """
+    Offers seen by this worker, by transfer id.
+
+    A transfer is forgotten when its sender or recipient closes it, when
+    the sender disconnects, or when the sender has MAX_TRANSFERS newer ones.
+    Resuming is offering the same id again.
+    """
+    def __init__(self, max_per_sender: int = MAX_TRANSFERS):
+        self.max_per_sender = max_per_sender
+        self._transfers: Dict[str, Transfer] = {}
+        self._by_sender: Dict[str, OrderedDict] = {} # sender -> ids, oldest first
+
+    def __len__(self):
+        return len(self._transfers)
+
+    def offer(self, transfer_id: str, sender: str, recipient: str, size: int, chunk: int) -> bool:
+        """Remember an offer. Returns False if the id belongs to another sender's transfer."""
+        known = self._transfers.get(transfer_id)
+        if known is not None and known.sender != sender:
+            return False
+        self._transfers[transfer_id] = Transfer(sender, recipient, size, chunk)
+        ids = self._by_sender.setdefault(sender, OrderedDict())
+        ids[transfer_id] = None
+        ids.move_to_end(transfer_id)
+        while len(ids) > self.max_per_sender:
+            oldest, _ = ids.popitem(last=False)
+            del self._transfers[oldest]
+        return True
+
+    def check(self, transfer_id: str, sender: str, recipient: str, offset: int, length: int) -> Optional[str]:
+        """Why a chunk must not be forwarded, None if it may."""
+        transfer = self._transfers.get(transfer_id)
+        if transfer is None or transfer.sender != sender or transfer.recipient != recipient:
+            return "Невідома передача файлу."
+        if offset % transfer.chunk or offset > max(transfer.size - 1, 0):
+            return "Некоректне зміщення у файлі."
+        if length > min(transfer.chunk, transfer.size - offset) + CHUNK_OVERHEAD:
+            return "Завеликий фрагмент файлу."
+        return None
+
+    def close(self, transfer_id: str, username: str):
+        """Forget a transfer on done or cancel from either side."""
+        transfer = self._transfers.get(transfer_id)
+        if transfer is not None and username in (transfer.sender, transfer.recipient):
+            del self._transfers[transfer_id]
+            self._by_sender[transfer.sender].pop(transfer_id, None)
+
+    def drop_user(self, username: str):
+        """Forget the transfers a disconnected user was sending, they resume with a new offer."""
+        for transfer_id in self._by_sender.pop(username, ()):
+            del self._transfers[transfer_id]